@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import io
+import json
+import time
+import numpy as np
+import pandas as pd
+from gcs_utils import (upload_bytes_to_gcs, load_parquet_from_gcs, load_parquet_blobs, list_blobs,
+                       list_blob_hashes, get_gcs_client, CREDENTIALS_PATH)
+
+QUOTES_PREFIX = "raw/stock_quote/"
+DIVIDENDS_PREFIX = "raw/dividends/"
+OUTPUT_PREFIX = "derived/adjusted_prices/"
+MANIFEST_PATH = f"{OUTPUT_PREFIX}_manifest.parquet"
+
+# Dividend percentages are quoted on the 10,000 VND par value; VCI prices are in thousands of VND
+PAR_VALUE = 10.0
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+EVENT_COLUMNS = ["symbol", "exercise_date", "cash", "stock_ratio"]
+MANIFEST_COLUMNS = ["symbol", "dividends_fingerprint", "quote_files", "last_time", "last_event", "next_event"]
+
+
+def dividend_events(dividends_df):
+    """
+    Turn raw dividend rows into one adjustment event per (symbol, exercise_date).
+
+    Returns columns: symbol, exercise_date, cash (price units per share), stock_ratio
+    (new shares per old share).
+    """
+    events = pd.DataFrame({
+        "symbol": dividends_df["symbol"],
+        "exercise_date": pd.to_datetime(dividends_df["exercise_date"], errors="coerce").dt.normalize(),
+    })
+    method = dividends_df["issue_method"].astype(str).str.lower()
+    percentage = pd.to_numeric(dividends_df["cash_dividend_percentage"], errors="coerce").fillna(0.0)
+    is_stock = method.str.contains("share|stock|cổ phiếu", regex=True)
+    events["cash"] = np.where(is_stock, 0.0, percentage * PAR_VALUE)
+    events["stock_ratio"] = np.where(is_stock, percentage, 0.0)
+
+    # Announced events only adjust prices once their ex-date has been reached
+    events = events.dropna(subset=["exercise_date"])
+    events = events[events["exercise_date"] <= pd.Timestamp.today().normalize()]
+    events = events[(events["cash"] > 0) | (events["stock_ratio"] > 0)]
+    # Several rows on one ex-date: cash amounts add up, stock ratios compound
+    return (events.groupby(["symbol", "exercise_date"], as_index=False)
+            .agg(cash=("cash", "sum"), stock_ratio=("stock_ratio", lambda r: np.prod(1 + r) - 1)))
+
+
+def adjust_prices(quotes_df, events):
+    """
+    Backward-adjust OHLCV bars of all symbols at once.
+
+    An event's price factor is (1 - cash / previous close) / (1 + stock_ratio) and its
+    share factor is 1 / (1 + stock_ratio). A bar is multiplied by the product of the
+    factors of every event after it, so the latest prices stay unadjusted.
+    """
+    bars = quotes_df.copy()
+    bars["time"] = pd.to_datetime(bars["time"]).astype("datetime64[ns]")
+    bars = bars.sort_values("time").reset_index(drop=True)
+
+    if events.empty:
+        bars["price_factor"] = 1.0
+        bars["share_factor"] = 1.0
+    else:
+        events = events.sort_values("exercise_date").reset_index(drop=True)
+        events["exercise_date"] = events["exercise_date"].astype("datetime64[ns]")
+
+        # Close of the last bar strictly before each ex-date
+        prev_close = pd.merge_asof(
+            events, bars[["symbol", "time", "close"]].rename(columns={"time": "exercise_date"}),
+            on="exercise_date", by="symbol", direction="backward", allow_exact_matches=False,
+        )["close"]
+        cash_factor = (1 - events["cash"] / prev_close).where(prev_close > 0, 1.0).clip(lower=0.0)
+        events["share_factor"] = 1 / (1 + events["stock_ratio"])
+        events["price_factor"] = cash_factor * events["share_factor"]
+
+        # Product of the factors of this event and every later event of the same symbol
+        later_first = events.iloc[::-1]
+        events["cum_price_factor"] = later_first.groupby("symbol")["price_factor"].cumprod()
+        events["cum_share_factor"] = later_first.groupby("symbol")["share_factor"].cumprod()
+
+        # Each bar takes the cumulative factor of the first event after it
+        bars = pd.merge_asof(
+            bars, events[["symbol", "exercise_date", "cum_price_factor", "cum_share_factor"]],
+            left_on="time", right_on="exercise_date", by="symbol",
+            direction="forward", allow_exact_matches=False,
+        )
+        bars["price_factor"] = bars["cum_price_factor"].fillna(1.0)
+        bars["share_factor"] = bars["cum_share_factor"].fillna(1.0)
+        bars = bars.drop(columns=["exercise_date", "cum_price_factor", "cum_share_factor"])
+
+    for col in PRICE_COLUMNS:
+        bars[f"adj_{col}"] = bars[col] * bars["price_factor"]
+    bars["adj_volume"] = bars["volume"] / bars["share_factor"]
+    return bars.sort_values(["symbol", "time"]).reset_index(drop=True)
+
+
+def symbol_of(blob_name):
+    """raw/<dataset>/<symbol>/<file>.parquet -> symbol"""
+    return blob_name.split("/")[2]
+
+
+def fingerprints(blob_hashes):
+    """Hash the (name, md5) pairs of each symbol's input files; a change in any file changes the hash."""
+    by_symbol = {}
+    for name, md5 in blob_hashes.items():
+        if name.endswith(".parquet"):
+            by_symbol.setdefault(symbol_of(name), []).append(f"{name}:{md5}")
+    return {symbol: hashlib.sha1("|".join(sorted(parts)).encode()).hexdigest()
+            for symbol, parts in by_symbol.items()}
+
+
+def load_manifest(client):
+    """
+    Per-symbol state of the last run: symbol -> dividends_fingerprint, quote_files (JSON of
+    blob name -> md5), last_time (last adjusted bar), last_event and next_event (ex-dates).
+    """
+    try:
+        manifest = load_parquet_from_gcs(MANIFEST_PATH, client=client)
+    except Exception as e:
+        print(f"⚠️ No manifest found, recomputing every symbol.\n{e}")
+        return {}
+    if set(MANIFEST_COLUMNS) - set(manifest.columns):
+        print("⚠️ Manifest has an older layout, recomputing every symbol.")
+        return {}
+    return {row["symbol"]: row for row in manifest.to_dict("records")}
+
+
+def event_dates(dividends_df, events, today):
+    """Last ex-date already applied and next announced ex-date, per symbol."""
+    ex_dates = pd.to_datetime(dividends_df["exercise_date"], errors="coerce").dt.normalize()
+    upcoming = ex_dates[ex_dates > today].groupby(dividends_df["symbol"]).min()
+    return events.groupby("symbol")["exercise_date"].max(), upcoming
+
+
+def new_bars(quotes_df, adjusted_df, manifest):
+    """
+    Compare fresh quote rows with a symbol's adjusted output.
+
+    A bar that is not adjusted yet can be appended with factors of 1 when it falls after
+    the symbol's last ex-date. A bar before that ex-date, or a change to a bar already
+    adjusted, means the symbol has to be recomputed. Returns (bars to append, symbols to
+    recompute).
+    """
+    key = ["symbol", "time"]
+    raw_columns = key + PRICE_COLUMNS + ["volume"]
+    quotes_df = quotes_df.drop_duplicates(subset=key, keep="last").reset_index(drop=True)
+    merged = quotes_df[raw_columns].merge(adjusted_df[raw_columns], on=key, how="left",
+                                          suffixes=("", "_adjusted"), indicator=True)
+    is_new = (merged["_merge"] == "left_only").to_numpy()
+
+    changed = np.zeros(len(merged), dtype=bool)
+    for col in PRICE_COLUMNS + ["volume"]:
+        changed |= ~is_new & (merged[col].fillna(-1) != merged[f"{col}_adjusted"].fillna(-1)).to_numpy()
+    last_event = pd.to_datetime(merged["symbol"].map({s: m["last_event"] for s, m in manifest.items()}))
+    before_event = is_new & (merged["time"] <= last_event).to_numpy()
+
+    recompute = set(merged.loc[changed | before_event, "symbol"])
+    return quotes_df[is_new & ~quotes_df["symbol"].isin(recompute).to_numpy()], recompute
+
+
+def main(full=False):
+    start = time.perf_counter()
+    client = get_gcs_client(CREDENTIALS_PATH)
+    today = pd.Timestamp.today().normalize()
+
+    quote_hashes = {n: md5 for n, md5 in list_blob_hashes(QUOTES_PREFIX, client=client).items()
+                    if n.endswith(".parquet")}
+    dividend_hashes = list_blob_hashes(DIVIDENDS_PREFIX, client=client)
+    dividend_fingerprints = fingerprints(dividend_hashes)
+    quote_files = {}
+    for name, md5 in quote_hashes.items():
+        quote_files.setdefault(symbol_of(name), {})[name] = md5
+
+    manifest = {} if full else load_manifest(client)
+
+    # The current year's quote file changes every day, so quotes only decide what to append;
+    # a full recompute is needed when dividends change or an announced ex-date is reached
+    recompute, append = [], []
+    for symbol, files in sorted(quote_files.items()):
+        entry = manifest.get(symbol)
+        if (entry is None or entry["dividends_fingerprint"] != dividend_fingerprints.get(symbol, "")
+                or (pd.notna(entry["next_event"]) and pd.Timestamp(entry["next_event"]) <= today)):
+            recompute.append(symbol)
+        elif json.loads(entry["quote_files"]) != files:
+            append.append(symbol)
+    print(f"{len(recompute)} of {len(quote_files)} symbols need recomputing, {len(append)} may have new bars")
+
+    outputs = []
+    if append:
+        changed_files = [n for s in append for n, md5 in quote_files[s].items()
+                         if json.loads(manifest[s]["quote_files"]).get(n) != md5]
+        quotes_df = load_parquet_blobs(changed_files, client=client)
+        # A symbol whose adjusted file is missing cannot be appended to
+        existing = set(list_blobs(OUTPUT_PREFIX, client=client))
+        adjusted_files = [f"{OUTPUT_PREFIX}{s}/adjusted_prices.parquet" for s in append]
+        adjusted_df = load_parquet_blobs([n for n in adjusted_files if n in existing], client=client)
+        missing = set(append) - set(adjusted_df.get("symbol", []))
+        if quotes_df.empty or len(missing) == len(append):
+            fresh, late = pd.DataFrame(), missing
+        else:
+            quotes_df["time"] = pd.to_datetime(quotes_df["time"]).astype("datetime64[ns]")
+            adjusted_df["time"] = pd.to_datetime(adjusted_df["time"]).astype("datetime64[ns]")
+            fresh, late = new_bars(quotes_df[~quotes_df["symbol"].isin(missing)], adjusted_df, manifest)
+            late |= missing
+        recompute = sorted(set(recompute) | late)
+        if not fresh.empty:
+            appended = adjust_prices(fresh, pd.DataFrame(columns=EVENT_COLUMNS))
+            outputs.append(pd.concat([adjusted_df[adjusted_df["symbol"].isin(appended["symbol"])], appended],
+                                     ignore_index=True))
+        for symbol in set(append) - late:
+            manifest[symbol] = dict(manifest[symbol], quote_files=json.dumps(quote_files[symbol], sort_keys=True))
+        print(f"Appending {len(fresh)} new bars, {len(late)} symbols have late or corrected bars")
+
+    events = pd.DataFrame(columns=EVENT_COLUMNS)
+    if recompute:
+        recompute_set = set(recompute)
+        quotes_df = load_parquet_blobs([n for s in recompute for n in quote_files[s]], client=client)
+        dividends_df = load_parquet_blobs(
+            [n for n in dividend_hashes if n.endswith(".parquet") and symbol_of(n) in recompute_set], client=client)
+        if not dividends_df.empty:
+            events = dividend_events(dividends_df)
+            last_events, next_events = event_dates(dividends_df, events, today)
+        else:
+            last_events, next_events = pd.Series(dtype="datetime64[ns]"), pd.Series(dtype="datetime64[ns]")
+        outputs.append(adjust_prices(quotes_df, events))
+        for symbol in recompute:
+            manifest[symbol] = {
+                "symbol": symbol,
+                "dividends_fingerprint": dividend_fingerprints.get(symbol, ""),
+                "quote_files": json.dumps(quote_files[symbol], sort_keys=True),
+                "last_event": last_events.get(symbol, pd.NaT),
+                "next_event": next_events.get(symbol, pd.NaT),
+            }
+
+    bars = 0
+    for adjusted in outputs:
+        for symbol, group in adjusted.groupby("symbol"):
+            group = group.sort_values("time").reset_index(drop=True)
+            buffer = io.BytesIO()
+            group.to_parquet(buffer, index=False)
+            buffer.seek(0)
+            upload_bytes_to_gcs(buffer, f"{OUTPUT_PREFIX}{symbol}/adjusted_prices.parquet", client=client)
+            manifest[symbol]["last_time"] = group["time"].iloc[-1]
+            bars += len(group)
+
+    manifest_df = pd.DataFrame(list(manifest.values()), columns=MANIFEST_COLUMNS)
+    buffer = io.BytesIO()
+    manifest_df.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    upload_bytes_to_gcs(buffer, MANIFEST_PATH, client=client)
+    print(f"Wrote {bars} bars for {sum(a['symbol'].nunique() for a in outputs)} symbols "
+          f"({len(recompute)} recomputed, {len(events)} events) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build dividend-adjusted prices from raw quotes and dividends.")
+    parser.add_argument("--full", action="store_true", help="Recompute every symbol, ignoring the manifest.")
+    args = parser.parse_args()
+    main(full=args.full)
@@ -0,0 +1,72 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+import pandas as pd
+from gcs_utils import load_parquet_from_gcs, get_gcs_client, CREDENTIALS_PATH
+
+CLEANER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Both paths write here instead of cleaned/, so a benchmark never touches production files
+SCRATCH_PREFIX = "scratch/benchmark/"
+
+# Datasets that have a standalone cleaning script
+SCRIPTS = {
+    "officers": "officers.py",
+    "shareholders": "shareholders.py",
+}
+
+
+def run_timed(args):
+    """Run a command in the cleaner directory and return its wall time in seconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=CLEANER_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def same_rows(left, right):
+    """True if both frames have the same columns and the same rows, in any order."""
+    if list(left.columns) != list(right.columns) or len(left) != len(right):
+        return False
+    return sorted(pd.util.hash_pandas_object(left, index=False)) == \
+        sorted(pd.util.hash_pandas_object(right, index=False))
+
+
+def compare_outputs(datasets, scripts_prefix, runner_prefix):
+    """Check that the per-script and runner paths wrote identical files; returns False on a mismatch."""
+    client = get_gcs_client(CREDENTIALS_PATH)
+    ok = True
+    for name in datasets:
+        path = f"{name}/{name}.parquet"
+        scripts_df = load_parquet_from_gcs(f"{scripts_prefix}{path}", client=client)
+        runner_df = load_parquet_from_gcs(f"{runner_prefix}{path}", client=client)
+        same = same_rows(scripts_df, runner_df)
+        ok = ok and same
+        print(f"{'✅' if same else '❌'} {name}: per-script {len(scripts_df)} rows, runner {len(runner_df)} rows")
+    return ok
+
+
+def main(datasets, repeat):
+    """Compare end-to-end cleaning time of one process per script against the shared-session runner."""
+    scripts_prefix, runner_prefix = f"{SCRATCH_PREFIX}scripts/", f"{SCRATCH_PREFIX}runner/"
+    per_script, runner = [], []
+    for _ in range(repeat):
+        per_script.append(sum(run_timed([SCRIPTS[name], "--output-prefix", scripts_prefix]) for name in datasets))
+        runner.append(run_timed(["runner.py", "--datasets"] + datasets + ["--output-prefix", runner_prefix]))
+
+    best_scripts, best_runner = min(per_script), min(runner)
+    print(f"\nDatasets: {', '.join(datasets)} (best of {repeat})")
+    print(f"{'per-script':<12} {best_scripts:>8.1f}s")
+    print(f"{'runner':<12} {best_runner:>8.1f}s")
+    print(f"{'speedup':<12} {best_scripts / best_runner:>8.2f}x")
+    return compare_outputs(datasets, scripts_prefix, runner_prefix)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-script cleaning against the shared-session runner.")
+    parser.add_argument("--datasets", nargs="+", choices=list(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs; the best is reported.")
+    args = parser.parse_args()
+    if not main(args.datasets, args.repeat):
+        sys.exit(1)
@@ -3,6 +3,7 @@ import os
 import pandas as pd
 from dotenv import load_dotenv
 import io
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
@@ -90,4 +91,89 @@ def load_parquet_from_gcs(blob_name, client=None):
     buffer.seek(0)
 
     df = pd.read_parquet(buffer)
-    return df
\ No newline at end of file
+    return df
+
+
+def list_blobs(prefix, client=None):
+    """
+    List blob names under a prefix in the GCS bucket.
+
+    Parameters:
+        prefix (str): The blob prefix, e.g. "raw/stock_quote/".
+        client (google.cloud.storage.Client): Optional pre-initialized GCS client.
+
+    Returns:
+        list[str]: Blob names under the prefix.
+    """
+    if not BUCKET_NAME:
+        raise ValueError("❌ GCS_BUCKET not set in environment variables!")
+
+    if client is None:
+        client = get_gcs_client(CREDENTIALS_PATH)
+
+    return [blob.name for blob in client.list_blobs(BUCKET_NAME, prefix=prefix)]
+
+
+
+def list_blob_hashes(prefix, client=None):
+    """
+    List blobs under a prefix with their MD5 hashes, to detect changed files without downloading them.
+
+    Parameters:
+        prefix (str): The blob prefix, e.g. "raw/dividends/".
+        client (google.cloud.storage.Client): Optional pre-initialized GCS client.
+
+    Returns:
+        dict[str, str]: Blob name -> base64 MD5 hash.
+    """
+    if not BUCKET_NAME:
+        raise ValueError("❌ GCS_BUCKET not set in environment variables!")
+
+    if client is None:
+        client = get_gcs_client(CREDENTIALS_PATH)
+
+    return {blob.name: blob.md5_hash for blob in client.list_blobs(BUCKET_NAME, prefix=prefix)}
+
+
+def load_parquet_blobs(blob_names, client=None, max_workers=16):
+    """
+    Load several parquet files from GCS into one pandas DataFrame.
+
+    Files are downloaded concurrently; the lake is made of many small
+    per-(symbol, year) files, so the download latency dominates.
+
+    Parameters:
+        blob_names (list[str]): Blob paths in the GCS bucket.
+        client (google.cloud.storage.Client): Optional pre-initialized GCS client.
+        max_workers (int): Number of concurrent downloads.
+
+    Returns:
+        pd.DataFrame: All files concatenated (empty if there are none).
+    """
+    if client is None:
+        client = get_gcs_client(CREDENTIALS_PATH)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(lambda name: load_parquet_from_gcs(name, client=client), blob_names))
+
+    frames = [df for df in frames if not df.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def load_parquet_prefix(prefix, client=None, max_workers=16):
+    """
+    Load every parquet file under a prefix into one pandas DataFrame.
+
+    Parameters:
+        prefix (str): The blob prefix, e.g. "raw/stock_quote/".
+        client (google.cloud.storage.Client): Optional pre-initialized GCS client.
+        max_workers (int): Number of concurrent downloads.
+
+    Returns:
+        pd.DataFrame: All files concatenated (empty if there are none).
+    """
+    if client is None:
+        client = get_gcs_client(CREDENTIALS_PATH)
+
+    blob_names = [name for name in list_blobs(prefix, client=client) if name.endswith(".parquet")]
+    return load_parquet_blobs(blob_names, client=client, max_workers=max_workers)
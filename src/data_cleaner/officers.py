@@ -1,22 +1,29 @@
 from gcs_utils import upload_bytes_to_gcs, load_parquet_from_gcs, get_gcs_client
 from spark_session import get_spark
+import argparse
 import io
 import pandas as pd
 
-if __name__ == "__main__":
-    # Initialize Spark session
-    spark = get_spark("Officer Data")
+CLEANED_PREFIX = "cleaned/"
+
+
+def filter_officers(spark_df):
+    """Filter out rows where officer_name is "None"."""
+    return spark_df.filter(spark_df["officer_name"] != "None")
+
+
+def clean_officers(spark, client, output_prefix=CLEANED_PREFIX):
+    """Clean raw/officers/officers.parquet and upload the result to <output_prefix>officers/."""
     gcs_path = "raw/officers/officers.parquet"
 
     # Load the Parquet file from GCS into a Pandas DataFrame
-    client = get_gcs_client('../../gcs_credentials.json')
     pandas_df = load_parquet_from_gcs(gcs_path, client=client)
 
     # Convert Pandas DataFrame to Spark DataFrame
     spark_df = spark.createDataFrame(pandas_df)
 
     # Filter out rows where officer_name is "None"
-    df_cleaned = spark_df.filter(spark_df["officer_name"] != "None")
+    df_cleaned = filter_officers(spark_df)
 
     # Show counts before and after cleaning
     print(f"Original count: {spark_df.count()}")
@@ -31,7 +38,18 @@ if __name__ == "__main__":
     buffer.seek(0)
 
     # Upload the cleaned Parquet file back to GCS
-    cleaned_gcs_path = "cleaned/officers/officers.parquet"
+    cleaned_gcs_path = f"{output_prefix}officers/officers.parquet"
     upload_bytes_to_gcs(buffer, cleaned_gcs_path, client=client)
     print(f"Cleaned data uploaded to GCS at {cleaned_gcs_path}")
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the raw officers dataset.")
+    parser.add_argument("--output-prefix", default=CLEANED_PREFIX,
+                        help=f"GCS prefix to write the cleaned file under (default: {CLEANED_PREFIX}).")
+    args = parser.parse_args()
+
+    # Initialize Spark session
+    spark = get_spark("Officer Data")
+    client = get_gcs_client('../../gcs_credentials.json')
+    clean_officers(spark, client, args.output_prefix)
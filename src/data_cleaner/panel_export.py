@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from gcs_utils import load_parquet_blobs, list_blobs, get_gcs_client, CREDENTIALS_PATH
+
+load_dotenv()
+
+PANEL_DIR = os.getenv("PANEL_DIR", "data/panel")
+QUOTES_PREFIX = "raw/stock_quote/"
+FIELDS = ["open", "high", "low", "close", "volume"]
+QUOTE_FILE_PATTERN = re.compile(r"raw/stock_quote/([^/]+)/stock_quote_(\d{4})\.parquet$")
+
+# Layout of a panel directory:
+#   meta.json        symbols (column order), fields, number of days
+#   dates.bin        int64 days since epoch, one per row
+#   <field>.bin      float64 matrix, day-major: row = trading day, column = symbol
+# Files are raw little-endian arrays rather than .npy so that appending days is a
+# plain file append; meta.json is written last and defines the valid shape.
+
+
+def open_panel(path=PANEL_DIR):
+    """
+    Memory-map a panel without reading it.
+
+    Returns (dates, symbols, fields) where dates is a datetime64[D] array, symbols a
+    list, and fields a dict of read-only (days x symbols) np.memmap arrays. Pages are
+    loaded lazily and shared between processes through the OS page cache.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    n_days, n_symbols = meta["days"], len(meta["symbols"])
+
+    dates = np.memmap(os.path.join(path, "dates.bin"), dtype="<i8", mode="r", shape=(n_days,))
+    fields = {
+        field: np.memmap(os.path.join(path, f"{field}.bin"), dtype="<f8", mode="r", shape=(n_days, n_symbols))
+        for field in meta["fields"]
+    }
+    return dates.view("datetime64[D]"), meta["symbols"], fields
+
+
+def panel_frame(path, field):
+    """One field of the panel as a DataFrame (dates x symbols) backed by the memory map."""
+    dates, symbols, fields = open_panel(path)
+    return pd.DataFrame(fields[field], index=pd.DatetimeIndex(dates), columns=symbols, copy=False)
+
+
+def to_dense(quotes_df, symbols, fields):
+    """Pivot long quote rows into dense (days x symbols) float64 matrices aligned on trading days."""
+    quotes_df = quotes_df.drop_duplicates(subset=["symbol", "time"], keep="last")
+    dates = np.sort(quotes_df["time"].unique())
+    row = np.searchsorted(dates, quotes_df["time"].to_numpy())
+    col = pd.Index(symbols).get_indexer(quotes_df["symbol"])
+
+    matrices = {}
+    for field in fields:
+        matrix = np.full((len(dates), len(symbols)), np.nan, dtype="<f8")
+        matrix[row, col] = quotes_df[field].to_numpy(dtype="f8")
+        matrices[field] = matrix
+    return dates.astype("datetime64[D]"), matrices
+
+
+def load_quotes(client, since_year=None):
+    """Load raw quote partitions, optionally only the yearly files from `since_year` on."""
+    blob_names = []
+    for name in list_blobs(QUOTES_PREFIX, client=client):
+        match = QUOTE_FILE_PATTERN.match(name)
+        if match and (since_year is None or int(match.group(2)) >= since_year):
+            blob_names.append(name)
+
+    quotes_df = load_parquet_blobs(blob_names, client=client)
+    if not quotes_df.empty:
+        quotes_df["time"] = pd.to_datetime(quotes_df["time"]).dt.normalize().astype("datetime64[ns]")
+    return quotes_df
+
+
+def write_panel(path, dates, symbols, matrices):
+    """Write a new panel to a temporary directory and swap it in."""
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    dates.astype("datetime64[D]").astype("<i8").tofile(os.path.join(tmp_path, "dates.bin"))
+    for field, matrix in matrices.items():
+        np.ascontiguousarray(matrix, dtype="<f8").tofile(os.path.join(tmp_path, f"{field}.bin"))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"symbols": list(symbols), "fields": list(matrices), "days": len(dates)}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def append_panel(path, meta, dates, matrices):
+    """Append new trading days to an existing panel in place."""
+    n_symbols = len(meta["symbols"])
+    with open(os.path.join(path, "dates.bin"), "r+b") as f:
+        # Drop bytes of an interrupted append beyond the shape recorded in meta.json
+        f.truncate(meta["days"] * 8)
+        f.seek(0, os.SEEK_END)
+        f.write(dates.astype("datetime64[D]").astype("<i8").tobytes())
+    for field, matrix in matrices.items():
+        with open(os.path.join(path, f"{field}.bin"), "r+b") as f:
+            f.truncate(meta["days"] * n_symbols * 8)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(matrix, dtype="<f8").tobytes())
+
+    meta = dict(meta, days=meta["days"] + len(dates))
+    with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+
+def patch_panel(path, meta, quotes_df):
+    """
+    Write bars for days the panel already has into its files in place, e.g. bars that
+    were crawled late or corrected. Returns the number of values changed, or None if a
+    bar falls on a day missing from the panel (rows cannot be inserted in place).
+    """
+    dates = open_panel(path)[0]
+    quotes_df = quotes_df.drop_duplicates(subset=["symbol", "time"], keep="last")
+    days = quotes_df["time"].to_numpy().astype("datetime64[D]")
+    row = np.searchsorted(dates, days)
+    if (row >= len(dates)).any() or (dates[row] != days).any():
+        return None
+    col = pd.Index(meta["symbols"]).get_indexer(quotes_df["symbol"])
+
+    changed = 0
+    for field in meta["fields"]:
+        matrix = np.memmap(os.path.join(path, f"{field}.bin"), dtype="<f8", mode="r+",
+                           shape=(meta["days"], len(meta["symbols"])))
+        values = quotes_df[field].to_numpy(dtype="f8")
+        current = matrix[row, col]
+        differs = ~((current == values) | (np.isnan(current) & np.isnan(values)))
+        if differs.any():
+            matrix[row[differs], col[differs]] = values[differs]
+            matrix.flush()
+            changed += int(differs.sum())
+        del matrix
+    return changed
+
+
+def export(path=PANEL_DIR, full=False):
+    start = time.perf_counter()
+    client = get_gcs_client(CREDENTIALS_PATH)
+
+    meta = None
+    if not full and os.path.exists(os.path.join(path, "meta.json")):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+    if meta and meta["days"]:
+        last_date = open_panel(path)[0][-1]
+        quotes_df = load_quotes(client, since_year=int(str(last_date)[:4]))
+        if quotes_df.empty:
+            print("Panel is up to date.")
+            return
+        new_symbols = set(quotes_df["symbol"]) - set(meta["symbols"])
+        if new_symbols:
+            print(f"New symbols {sorted(new_symbols)[:10]}..., rebuilding the panel")
+            return export(path, full=True)
+
+        # Bars for days the panel already has (late or corrected) are patched in place
+        late_quotes = quotes_df[quotes_df["time"] <= pd.Timestamp(last_date)]
+        patched = patch_panel(path, meta, late_quotes) if not late_quotes.empty else 0
+        if patched is None:
+            print("Late bars for trading days missing from the panel, rebuilding the panel")
+            return export(path, full=True)
+        if patched:
+            print(f"Updated {patched} values on days already in the panel")
+
+        new_quotes = quotes_df[quotes_df["time"] > pd.Timestamp(last_date)]
+        if new_quotes.empty:
+            print("Panel is up to date.")
+            return
+        dates, matrices = to_dense(new_quotes, meta["symbols"], meta["fields"])
+        append_panel(path, meta, dates, matrices)
+        print(f"Appended {len(dates)} days to {path} in {time.perf_counter() - start:.1f}s")
+        return
+
+    quotes_df = load_quotes(client)
+    if quotes_df.empty:
+        print("No stock quote data found.")
+        return
+    symbols = sorted(quotes_df["symbol"].unique())
+    dates, matrices = to_dense(quotes_df, symbols, FIELDS)
+    write_panel(path, dates, symbols, matrices)
+    print(f"Exported {len(dates)} days x {len(symbols)} symbols to {path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export quote history as a memory-mappable (days x symbols) panel.")
+    parser.add_argument("--path", default=PANEL_DIR, help=f"Panel directory (default: {PANEL_DIR}).")
+    parser.add_argument("--full", action="store_true", help="Rebuild the panel instead of appending new days.")
+    args = parser.parse_args()
+    export(args.path, full=args.full)
@@ -0,0 +1,172 @@
+import argparse
+import ast
+import io
+import time
+import pandas as pd
+from gcs_utils import upload_bytes_to_gcs, load_parquet_blobs, list_blobs, get_gcs_client, CREDENTIALS_PATH
+
+QUOTES_PREFIX = "raw/stock_quote/"
+OUTPUT_PREFIX = "derived/point_in_time/"
+STATEMENTS = ["income_statement", "balance_sheet", "cash_flow", "ratio"]
+
+# Days between the end of a report period and the day the report is assumed public.
+# Listed companies must publish quarterly reports within 30 days (45 for consolidated
+# reports) and audited annual reports within 90 days of the period end.
+QUARTERLY_LAG_DAYS = 45
+ANNUAL_LAG_DAYS = 90
+
+# Key columns as named by vnstock with lang="vi" and lang="en"
+KEY_COLUMNS = {
+    "symbol": ["CP", "ticker", "symbol"],
+    "year": ["Năm", "yearReport"],
+    "quarter": ["Kỳ", "lengthReport"],
+}
+
+
+def flatten_column(col):
+    """
+    The ratio report has (group, name) MultiIndex columns, which come back from
+    parquet as strings like "('Meta', 'CP')"; keep only the name.
+    """
+    if isinstance(col, str) and col.startswith("("):
+        try:
+            col = ast.literal_eval(col)
+        except (ValueError, SyntaxError):
+            return col
+    return col[-1] if isinstance(col, tuple) else col
+
+
+def normalize_reports(df, statement, quarterly_lag=QUARTERLY_LAG_DAYS, annual_lag=ANNUAL_LAG_DAYS):
+    """
+    Turn raw reports of one statement into rows keyed by (symbol, available_date).
+
+    Value columns are prefixed with the statement name so the four statements can sit
+    side by side. A period without a quarter (or quarter 5, vnstock's full year) is an
+    annual report ending on 31 December.
+    """
+    df = df.copy()
+    df.columns = [flatten_column(col) for col in df.columns]
+    df = df.loc[:, ~pd.Index(df.columns).duplicated()]
+
+    renames = {}
+    for key, candidates in KEY_COLUMNS.items():
+        found = next((col for col in candidates if col in df.columns), None)
+        if found:
+            renames[found] = key
+    df = df.rename(columns=renames)
+    if "symbol" not in df.columns or "year" not in df.columns:
+        raise ValueError(f"{statement}: report has no symbol/year columns")
+
+    year = pd.to_numeric(df["year"], errors="coerce")
+    quarter = pd.to_numeric(df["quarter"], errors="coerce") if "quarter" in df.columns else pd.Series(float("nan"), index=df.index)
+    is_quarterly = quarter.between(1, 4)
+
+    # Last day of the period: first day of the following quarter minus one day
+    end_month = (quarter.where(is_quarterly, 4) * 3).astype("Int64")
+    period_end = pd.to_datetime(
+        pd.DataFrame({"year": year.astype("Int64"), "month": end_month, "day": 1}), errors="coerce"
+    ) + pd.offsets.MonthEnd(0)
+    lag = pd.to_timedelta(is_quarterly.map({True: quarterly_lag, False: annual_lag}), unit="D")
+
+    values = df.drop(columns=[c for c in ("symbol", "year", "quarter") if c in df.columns])
+    values = values.select_dtypes("number").add_prefix(f"{statement}.")
+    out = pd.concat([
+        pd.DataFrame({
+            "symbol": df["symbol"].astype(str),
+            "available_date": (period_end + lag).astype("datetime64[ns]"),
+            f"{statement}.period_end": period_end.astype("datetime64[ns]"),
+        }),
+        values,
+    ], axis=1)
+
+    # A restated report for the same period replaces the earlier one
+    out = out.dropna(subset=["available_date"])
+    out = out.drop_duplicates(subset=["symbol", "available_date"], keep="last")
+    return out.sort_values("available_date").reset_index(drop=True)
+
+
+def point_in_time_join(quotes_df, reports):
+    """
+    Attach to every (symbol, trading day) the latest report of each statement that was
+    available on that day, for all symbols at once with one merge_asof per statement.
+
+    Parameters:
+        quotes_df (pd.DataFrame): Daily bars with at least symbol and time.
+        reports (dict[str, pd.DataFrame]): Statement name -> output of normalize_reports.
+    """
+    features = quotes_df.copy()
+    features["symbol"] = features["symbol"].astype(str)
+    features["time"] = pd.to_datetime(features["time"]).dt.normalize().astype("datetime64[ns]")
+    features = features.sort_values("time").reset_index(drop=True)
+
+    for statement, report_df in reports.items():
+        if report_df.empty:
+            continue
+        features = pd.merge_asof(
+            features, report_df, left_on="time", right_on="available_date", by="symbol", direction="backward",
+        ).drop(columns="available_date")
+    return features.sort_values(["symbol", "time"]).reset_index(drop=True)
+
+
+def blobs_by_symbol(prefix, client):
+    """raw/<dataset>/<symbol>/<file>.parquet -> {symbol: [blob names]}"""
+    by_symbol = {}
+    for name in list_blobs(prefix, client=client):
+        parts = name.split("/")
+        # Skip files directly under the prefix, such as a _manifest.parquet
+        if name.endswith(".parquet") and len(parts) == 4:
+            by_symbol.setdefault(parts[2], []).append(name)
+    return by_symbol
+
+
+def main(batch_size=100, quarterly_lag=QUARTERLY_LAG_DAYS, annual_lag=ANNUAL_LAG_DAYS, quotes_prefix=QUOTES_PREFIX,
+         symbols=None):
+    start = time.perf_counter()
+    client = get_gcs_client(CREDENTIALS_PATH)
+
+    quote_blobs = blobs_by_symbol(quotes_prefix, client)
+    report_blobs = {statement: blobs_by_symbol(f"raw/{statement}/", client) for statement in STATEMENTS}
+    universe = sorted(symbols or quote_blobs)
+    print(f"Building point-in-time features for {len(universe)} symbols in batches of {batch_size}")
+
+    total_rows = 0
+    for i in range(0, len(universe), batch_size):
+        batch = universe[i:i + batch_size]
+        quotes_df = load_parquet_blobs([n for s in batch for n in quote_blobs.get(s, [])], client=client)
+        if quotes_df.empty:
+            continue
+
+        reports = {}
+        for statement in STATEMENTS:
+            raw_df = load_parquet_blobs([n for s in batch for n in report_blobs[statement].get(s, [])], client=client)
+            try:
+                reports[statement] = normalize_reports(raw_df, statement, quarterly_lag, annual_lag) \
+                    if not raw_df.empty else pd.DataFrame()
+            except ValueError as e:
+                print(f"⚠️ Skipping {statement} for batch {batch[0]}..{batch[-1]}: {e}")
+
+        features = point_in_time_join(quotes_df, reports)
+        for symbol, group in features.groupby("symbol"):
+            buffer = io.BytesIO()
+            group.to_parquet(buffer, index=False)
+            buffer.seek(0)
+            upload_bytes_to_gcs(buffer, f"{OUTPUT_PREFIX}{symbol}/features.parquet", client=client)
+        total_rows += len(features)
+        print(f"✅ Batch {batch[0]}..{batch[-1]}: {len(features)} rows "
+              f"({time.perf_counter() - start:.1f}s elapsed)")
+
+    print(f"Wrote {total_rows} point-in-time rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="As-of join daily quotes with the financial reports known on each day.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Symbols joined per batch.")
+    parser.add_argument("--quarterly-lag", type=int, default=QUARTERLY_LAG_DAYS,
+                        help=f"Days after a quarter end before its report is used (default: {QUARTERLY_LAG_DAYS}).")
+    parser.add_argument("--annual-lag", type=int, default=ANNUAL_LAG_DAYS,
+                        help=f"Days after a year end before its annual report is used (default: {ANNUAL_LAG_DAYS}).")
+    parser.add_argument("--quotes-prefix", default=QUOTES_PREFIX,
+                        help="Daily bars to align, e.g. derived/adjusted_prices/ (default: raw quotes).")
+    parser.add_argument("--symbols", nargs="*", help="Only these symbols (default: every quoted symbol).")
+    args = parser.parse_args()
+    main(args.batch_size, args.quarterly_lag, args.annual_lag, args.quotes_prefix, args.symbols)
@@ -0,0 +1,111 @@
+import argparse
+import io
+import math
+import time
+from pyspark.sql import functions as F
+from gcs_utils import upload_bytes_to_gcs, load_parquet_from_gcs, get_gcs_client, CREDENTIALS_PATH
+from spark_session import get_spark
+from officers import filter_officers, CLEANED_PREFIX
+from shareholders import filter_shareholders
+
+COMPANIES_PATH = "raw/companies/companies.parquet"
+
+# Target rows per shuffle partition when sizing spark.sql.shuffle.partitions from the input
+ROWS_PER_PARTITION = 200_000
+
+# name -> (raw path, filter function or None); the cleaned file is <output prefix><name>/<name>.parquet
+DATASETS = {
+    "officers": ("raw/officers/officers.parquet", filter_officers),
+    "shareholders": ("raw/shareholders/shareholders.parquet", filter_shareholders),
+    "company_info": ("raw/company_info/company_info.parquet", None),
+}
+
+
+def shuffle_partitions_for(spark, num_rows):
+    """Size shuffle partitions from the input instead of Spark's fixed default of 200."""
+    max_partitions = spark.sparkContext.defaultParallelism * 4
+    return max(1, min(max_partitions, math.ceil(num_rows / ROWS_PER_PARTITION)))
+
+
+def load_universe(spark, client):
+    """Load the companies dimension once and cache it for broadcast joins."""
+    companies_pdf = load_parquet_from_gcs(COMPANIES_PATH, client=client)
+    columns = [col for col in ("symbol", "exchange", "type") if col in companies_pdf.columns]
+    universe = spark.createDataFrame(companies_pdf[columns]).withColumn("in_universe", F.lit(True)).cache()
+    print(f"Symbol universe: {universe.count()} symbols")
+    return universe
+
+
+def clean_dataset(spark, client, name, universe=None, output_prefix=CLEANED_PREFIX):
+    """
+    Clean one dataset on the shared session.
+
+    Rows are filtered with the dataset's cleaning rule, the same as the standalone
+    cleaning scripts do, so both write the same file. With a `universe`, rows are also
+    enriched with the companies dimension through a broadcast join and rows whose
+    symbol is not in the universe are dropped. Returns a dict of row counts.
+    """
+    raw_path, filter_fn = DATASETS[name]
+    pandas_df = load_parquet_from_gcs(raw_path, client=client)
+    spark.conf.set("spark.sql.shuffle.partitions", str(shuffle_partitions_for(spark, len(pandas_df))))
+
+    spark_df = spark.createDataFrame(pandas_df)
+    df_cleaned = filter_fn(spark_df) if filter_fn else spark_df
+
+    unknown_symbol, df_joined = 0, None
+    if universe is not None:
+        # Only bring in dimension columns the dataset doesn't already have (company_info has its own exchange)
+        dimension = universe.select(["symbol"] + [col for col in universe.columns
+                                                  if col != "symbol" and col not in spark_df.columns])
+        df_joined = df_cleaned.join(F.broadcast(dimension), on="symbol", how="left").cache()
+        df_cleaned = df_joined.filter(F.col("in_universe").isNotNull()).drop("in_universe")
+        unknown_symbol = df_joined.filter(F.col("in_universe").isNull()).count()
+
+    # Convert to Pandas -> Parquet buffer -> Upload
+    pdf_cleaned = df_cleaned.toPandas()
+    if df_joined is not None:
+        df_joined.unpersist()
+    buffer = io.BytesIO()
+    pdf_cleaned.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    upload_bytes_to_gcs(buffer, f"{output_prefix}{name}/{name}.parquet", client=client)
+
+    stats = {
+        "original": len(pandas_df),
+        "removed_by_rule": len(pandas_df) - len(pdf_cleaned) - unknown_symbol,
+        "unknown_symbol": unknown_symbol,
+        "cleaned": len(pdf_cleaned),
+    }
+    print(f"{name}: {stats}")
+    return stats
+
+
+def main(datasets, output_prefix=CLEANED_PREFIX, enrich=False):
+    start = time.perf_counter()
+    spark = get_spark("Cleaning Runner")
+    client = get_gcs_client(CREDENTIALS_PATH)
+    universe = load_universe(spark, client) if enrich else None
+
+    timings = {}
+    for name in datasets:
+        dataset_start = time.perf_counter()
+        clean_dataset(spark, client, name, universe, output_prefix)
+        timings[name] = time.perf_counter() - dataset_start
+
+    if universe is not None:
+        universe.unpersist()
+    for name, seconds in timings.items():
+        print(f"{name:<16} {seconds:>8.1f}s")
+    print(f"{'total':<16} {time.perf_counter() - start:>8.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean several datasets on one shared Spark session.")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS),
+                        help="Datasets to clean (default: all).")
+    parser.add_argument("--output-prefix", default=CLEANED_PREFIX,
+                        help=f"GCS prefix to write the cleaned files under (default: {CLEANED_PREFIX}).")
+    parser.add_argument("--enrich", action="store_true",
+                        help="Add the listing exchange and type and drop symbols outside the companies list.")
+    args = parser.parse_args()
+    main(args.datasets, args.output_prefix, args.enrich)
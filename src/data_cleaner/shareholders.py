@@ -1,24 +1,31 @@
 from gcs_utils import upload_bytes_to_gcs, load_parquet_from_gcs, get_gcs_client
 from spark_session import get_spark
+import argparse
 import io
 import pandas as pd
 
-if __name__ == "__main__":
-    # Initialize Spark session
-    spark = get_spark("Shareholder Data", key_path="../../gcs_credentials.json")
+CLEANED_PREFIX = "cleaned/"
+
+
+def filter_shareholders(spark_df):
+    """Filter out rows where share_own_percent == 0 OR share_holder == "Khác"."""
+    return spark_df.filter(
+        (spark_df["share_own_percent"] != 0.0) & (spark_df["share_holder"] != "Khác")
+    )
+
+
+def clean_shareholders(spark, client, output_prefix=CLEANED_PREFIX):
+    """Clean raw/shareholders/shareholders.parquet and upload the result to <output_prefix>shareholders/."""
     gcs_path = "raw/shareholders/shareholders.parquet"
 
     # Load Parquet from GCS into Pandas
-    client = get_gcs_client('../../gcs_credentials.json')
     pandas_df = load_parquet_from_gcs(gcs_path, client=client)
 
     # Convert Pandas to Spark DataFrame
     spark_df = spark.createDataFrame(pandas_df)
 
     # Filter out rows where share_own_percent == 0 OR share_holder == "Khác"
-    df_cleaned = spark_df.filter(
-        (spark_df["share_own_percent"] != 0.0) & (spark_df["share_holder"] != "Khác")
-    )
+    df_cleaned = filter_shareholders(spark_df)
 
     # Show counts
     print(f"Original count: {spark_df.count()}")
@@ -32,6 +39,18 @@ if __name__ == "__main__":
     pdf_cleaned.to_parquet(buffer, index=False)
     buffer.seek(0)
 
-    cleaned_gcs_path = "cleaned/shareholders/shareholders.parquet"
+    cleaned_gcs_path = f"{output_prefix}shareholders/shareholders.parquet"
     upload_bytes_to_gcs(buffer, cleaned_gcs_path, client=client)
     print(f"Cleaned data uploaded to GCS at {cleaned_gcs_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the raw shareholders dataset.")
+    parser.add_argument("--output-prefix", default=CLEANED_PREFIX,
+                        help=f"GCS prefix to write the cleaned file under (default: {CLEANED_PREFIX}).")
+    args = parser.parse_args()
+
+    # Initialize Spark session
+    spark = get_spark("Shareholder Data", key_path="../../gcs_credentials.json")
+    client = get_gcs_client('../../gcs_credentials.json')
+    clean_shareholders(spark, client, args.output_prefix)
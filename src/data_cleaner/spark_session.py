@@ -10,13 +10,19 @@ def get_spark(app_name="DataCleaner", key_path=None):
     # Use CREDENTIALS_PATH if key_path is not provided
     key_path = key_path or CREDENTIALS_PATH
 
-    return (
+    builder = (
         SparkSession.builder
         .appName(app_name)
         .config("spark.hadoop.google.cloud.auth.service.account.enable", "true")
         # .config("spark.hadoop.google.cloud.auth.service.account.json.keyfile", key_path)
         .config("spark.hadoop.fs.gs.impl", "com.google.cloud.hadoop.fs.gcs.GoogleHadoopFileSystem")
         .config("spark.hadoop.fs.AbstractFileSystem.gs.impl", "com.google.cloud.hadoop.fs.gcs.GoogleHadoopFS")
+        # Arrow makes createDataFrame(pandas_df) / toPandas() columnar instead of row-by-row pickling
+        .config("spark.sql.execution.arrow.pyspark.enabled", "true")
+        .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "true")
+        # Adaptive execution coalesces small shuffle partitions and picks broadcast joins at runtime
+        .config("spark.sql.adaptive.enabled", "true")
+        .config("spark.sql.adaptive.coalescePartitions.enabled", "true")
         .master("local[*]")
-        .getOrCreate()
-    )
\ No newline at end of file
+    )
+    return builder.getOrCreate()
@@ -0,0 +1,166 @@
+import argparse
+import io
+import time
+import numpy as np
+import pandas as pd
+from gcs_utils import (upload_bytes_to_gcs, load_parquet_from_gcs, load_parquet_prefix, get_gcs_client,
+                       CREDENTIALS_PATH)
+
+# Rule severities: failing an "error" rule quarantines the row, "warn" is only reported
+ERROR = "error"
+WARN = "warn"
+
+# A gap of more than this many business days between two bars of a symbol is reported.
+# Tết closes the market for up to a week, so shorter gaps are expected.
+MAX_TRADING_DAY_GAP = 7
+
+# Passing rows get their own prefix: cleaned/ belongs to the Spark cleaners and runner.py
+VALIDATED_PREFIX = "validated/"
+QUARANTINE_PREFIX = "quarantine/"
+QUALITY_PREFIX = "quality/"
+
+
+class Rule:
+    """A named check; `check(df)` returns a boolean Series that is True where the row fails."""
+
+    def __init__(self, name, check, severity=ERROR):
+        self.name = name
+        self.check = check
+        self.severity = severity
+
+
+def ohlc_inconsistent(df):
+    return ~(
+        (df["low"] <= df["open"]) & (df["open"] <= df["high"])
+        & (df["low"] <= df["close"]) & (df["close"] <= df["high"])
+    )
+
+
+def missing_price(df):
+    return df[["open", "high", "low", "close"]].isna().any(axis=1)
+
+
+def duplicate_key(df):
+    return df.duplicated(subset=["symbol", "time"], keep="first")
+
+
+def trading_day_gap(df):
+    """Flag bars that follow more than MAX_TRADING_DAY_GAP business days without a bar for the same symbol."""
+    order = np.lexsort((df["time"].to_numpy(), df["symbol"].to_numpy()))
+    symbols = df["symbol"].to_numpy()[order]
+    days = df["time"].to_numpy().astype("datetime64[D]")[order]
+
+    same_symbol = np.zeros(len(df), dtype=bool)
+    same_symbol[1:] = symbols[1:] == symbols[:-1]
+    gaps = np.zeros(len(df), dtype=np.int64)
+    gaps[1:] = np.busday_count(days[:-1], days[1:])
+
+    flagged = np.empty(len(df), dtype=bool)
+    flagged[order] = same_symbol & (gaps > MAX_TRADING_DAY_GAP)
+    return pd.Series(flagged, index=df.index)
+
+
+# Dataset name -> (raw location, partition columns, rules).
+# A location ending in "/" is a prefix of per-(symbol, year) files.
+DATASETS = {
+    "stock_quote": ("raw/stock_quote/", ["symbol", "year"], [
+        Rule("missing_price", missing_price),
+        Rule("ohlc_inconsistent", ohlc_inconsistent),
+        Rule("negative_volume", lambda df: df["volume"] < 0),
+        Rule("duplicate_key", duplicate_key),
+        Rule("trading_day_gap", trading_day_gap, severity=WARN),
+    ]),
+    "officers": ("raw/officers/officers.parquet", ["symbol"], [
+        Rule("missing_officer_name", lambda df: df["officer_name"].isna() | (df["officer_name"] == "None")),
+    ]),
+    "shareholders": ("raw/shareholders/shareholders.parquet", ["symbol"], [
+        Rule("zero_ownership", lambda df: df["share_own_percent"] == 0.0),
+        Rule("other_shareholder", lambda df: df["share_holder"] == "Khác"),
+    ]),
+}
+
+
+def validate(df, rules, partition_cols):
+    """
+    Evaluate every rule over the DataFrame in one vectorized pass.
+
+    Returns (clean_df, quarantine_df, summary_df):
+        clean_df: rows that pass every "error" rule.
+        quarantine_df: the other rows, with a `failed_rules` column naming the failed rules.
+        summary_df: one row per partition with row counts and failures per rule.
+    """
+    failures = pd.DataFrame({rule.name: rule.check(df).fillna(True).astype(bool) for rule in rules},
+                            index=df.index)
+    error_rules = [rule.name for rule in rules if rule.severity == ERROR]
+    rejected = failures[error_rules].any(axis=1)
+
+    quarantine_df = df[rejected].copy()
+    rejected_failures = failures[rejected]
+    failed_rules = pd.Series("", index=rejected_failures.index)
+    for rule in rules:
+        failed_rules += np.where(rejected_failures[rule.name], rule.name + ",", "")
+    quarantine_df["failed_rules"] = failed_rules.str.rstrip(",")
+
+    keys = [df[col] for col in partition_cols]
+    summary_df = failures.astype(np.int64).groupby(keys).sum()
+    summary_df.insert(0, "rows", failures.groupby(keys).size())
+    summary_df.insert(1, "quarantined", rejected.astype(np.int64).groupby(keys).sum())
+    summary_df = summary_df.reset_index()
+
+    return df[~rejected], quarantine_df, summary_df
+
+
+def to_parquet_buffer(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def load_dataset(name, client):
+    """Load a raw dataset in one scan, adding the columns its rules and partitions need."""
+    location, _, _ = DATASETS[name]
+    if location.endswith("/"):
+        df = load_parquet_prefix(location, client=client)
+    else:
+        df = load_parquet_from_gcs(location, client=client)
+
+    if name == "stock_quote" and not df.empty:
+        df["time"] = pd.to_datetime(df["time"], errors="coerce")
+        df = df.dropna(subset=["time"])
+        df["year"] = df["time"].dt.year
+    return df
+
+
+def main(name):
+    start = time.perf_counter()
+    client = get_gcs_client(CREDENTIALS_PATH)
+    _, partition_cols, rules = DATASETS[name]
+
+    df = load_dataset(name, client)
+    if df.empty:
+        print(f"No {name} data found.")
+        return
+    load_seconds = time.perf_counter() - start
+
+    clean_df, quarantine_df, summary_df = validate(df, rules, partition_cols)
+    print(f"{name}: {len(df)} rows, {len(quarantine_df)} quarantined "
+          f"(loaded in {load_seconds:.1f}s, validated in {time.perf_counter() - start - load_seconds:.1f}s)")
+    print(summary_df.drop(columns=partition_cols).sum().to_string())
+
+    if name == "stock_quote":
+        for (symbol, year), group in clean_df.groupby(["symbol", "year"]):
+            file_path = f"{VALIDATED_PREFIX}stock_quote/{symbol}/stock_quote_{year}.parquet"
+            upload_bytes_to_gcs(to_parquet_buffer(group.drop(columns="year")), file_path, client=client)
+    else:
+        upload_bytes_to_gcs(to_parquet_buffer(clean_df), f"{VALIDATED_PREFIX}{name}/{name}.parquet", client=client)
+
+    upload_bytes_to_gcs(to_parquet_buffer(quarantine_df), f"{QUARANTINE_PREFIX}{name}/{name}.parquet", client=client)
+    upload_bytes_to_gcs(to_parquet_buffer(summary_df), f"{QUALITY_PREFIX}{name}/summary.parquet", client=client)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a raw dataset, quarantining rows that fail its rules.")
+    parser.add_argument("dataset", choices=list(DATASETS))
+    args = parser.parse_args()
+    main(args.dataset)
@@ -0,0 +1,154 @@
+"""
+Single entry point for the crawler: python -m data_crawler <command> [args]
+
+Nothing heavy is imported until a command runs, so `--help`, `queue status` and the
+import-time report start instantly. Run it from src/ (or with src on PYTHONPATH).
+"""
+import argparse
+import importlib
+import os
+import re
+import runpy
+import subprocess
+import sys
+
+CRAWLER_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(CRAWLER_DIR)
+
+# The crawler modules import each other by their flat names
+if CRAWLER_DIR not in sys.path:
+    sys.path.insert(0, CRAWLER_DIR)
+
+# Crawl services: command -> (module, help). They are run through module.main().
+SERVICES = {
+    "companies": ("companies", "Refresh the companies list."),
+    "company_info": ("company_info", "Crawl company overviews and profiles."),
+    "officers": ("officers", "Crawl company officers."),
+    "shareholders": ("shareholders", "Crawl major shareholders."),
+    "dividends": ("dividends", "Crawl dividend history."),
+    "stock_quote": ("stock_quote", "Crawl daily quote history."),
+    "financial_data": ("financial_data", "Crawl financial statements and ratios."),
+}
+
+# Tools with their own argument parser: command -> (module, help). Arguments are passed through.
+TOOLS = {
+    "all": ("orchestrator", "Run every crawl service as one dependency graph."),
+    "intraday": ("intraday_quote", "Stream intraday trades."),
+    "worker": ("worker", "Run the warm worker daemon."),
+    "queue": ("job_queue", "Submit jobs to the worker queue or show their status."),
+    "archive": ("response_archive", "Inspect the raw response archive or rebuild datasets from it."),
+}
+
+# Import-time budgets in seconds; the report exits non-zero when one is exceeded.
+# Services import pandas and vnstock only when they run, so they get a tight budget.
+CLI_IMPORT_BUDGET = 0.1
+SERVICE_IMPORT_BUDGET = 0.25
+MODULE_IMPORT_BUDGET = 2.0
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (.*)$")
+
+
+def parse_import_time(stderr):
+    """Parse `-X importtime` output into (name, depth, self seconds, cumulative seconds) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            name = match.group(3)
+            depth = (len(name) - len(name.lstrip())) // 2
+            rows.append((name.strip(), depth, int(match.group(1)) / 1e6, int(match.group(2)) / 1e6))
+    return rows
+
+
+def measure_import(module):
+    """Import `module` in a fresh interpreter; returns the parsed rows, or None if the import fails."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([CRAWLER_DIR, SRC_DIR, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"❌ import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+        return None
+    return parse_import_time(result.stderr)
+
+
+def import_time_report(modules, budget=MODULE_IMPORT_BUDGET, top=5):
+    """
+    Print how long each module takes to import and its heaviest dependencies.
+
+    Interpreter start-up imports are measured once and left out. Returns False if a
+    module fails to import or exceeds its budget.
+    """
+    startup = {name for name, _, _, _ in measure_import("sys") or []}
+    ok = True
+    for module in modules:
+        rows = measure_import(module)
+        if rows is None:
+            ok = False
+            continue
+        rows = [row for row in rows if row[0] not in startup]
+        total = sum(cumulative for _, depth, _, cumulative in rows if depth == 0)
+        if module == "data_crawler.__main__":
+            limit = CLI_IMPORT_BUDGET
+        elif module in (service for service, _ in SERVICES.values()):
+            limit = min(budget, SERVICE_IMPORT_BUDGET)
+        else:
+            limit = budget
+        status = "✅" if total <= limit else "🐢"
+        ok = ok and total <= limit
+        print(f"{status} {module}: {total:.3f}s (budget {limit:.2f}s)")
+
+        heaviest = sorted((row for row in rows if row[1] == 1), key=lambda row: row[3], reverse=True)[:top]
+        for name, _, _, cumulative in heaviest:
+            print(f"     {cumulative:.3f}s  {name}")
+    return ok
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m data_crawler", description="VNStock crawler.")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>", required=True)
+
+    for command, (_, help_text) in SERVICES.items():
+        service_parser = subparsers.add_parser(command, help=help_text, description=help_text)
+        if command != "companies":
+            service_parser.add_argument("--test", action=argparse.BooleanOptionalAction, default=None,
+                                        help="Only crawl the first 10 symbols (default: IS_TEST).")
+
+    for command, (_, help_text) in TOOLS.items():
+        # Arguments, including --help, are left for the tool's own parser
+        subparsers.add_parser(command, help=help_text, add_help=False)
+
+    report_parser = subparsers.add_parser("import-time", help="Report import times against a budget.")
+    report_parser.add_argument("modules", nargs="*",
+                               help="Modules to measure (default: the CLI and every command's module).")
+    report_parser.add_argument("--budget", type=float, default=MODULE_IMPORT_BUDGET,
+                               help=f"Seconds allowed per module (default: {MODULE_IMPORT_BUDGET}).")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, tool_args = parser.parse_known_args(argv)
+    if tool_args and args.command not in TOOLS:
+        parser.error(f"unrecognized arguments: {' '.join(tool_args)}")
+
+    if args.command == "import-time":
+        modules = args.modules or (["data_crawler.__main__"]
+                                   + [module for module, _ in {**SERVICES, **TOOLS}.values()])
+        return 0 if import_time_report(modules, args.budget) else 1
+
+    if args.command in TOOLS:
+        module = TOOLS[args.command][0]
+        sys.argv = [f"{module}.py"] + tool_args
+        runpy.run_module(module, run_name="__main__")
+        return 0
+
+    module = importlib.import_module(SERVICES[args.command][0])
+    if args.command == "companies":
+        module.main()
+    else:
+        module.main(module.IS_TEST if args.test is None else args.test)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
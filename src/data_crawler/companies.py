@@ -6,23 +6,33 @@ from gcs_utils import upload_bytes_to_gcs, load_parquet_from_gcs, get_gcs_client
 load_dotenv()
 
 ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
+# Symbol universe, e.g. UNIVERSE_EXCHANGES=HSX,HNX,UPCOM
+UNIVERSE_EXCHANGES = tuple(os.getenv("UNIVERSE_EXCHANGES", "HSX").split(","))
+UNIVERSE_TYPES = tuple(os.getenv("UNIVERSE_TYPES", "STOCK").split(","))
 
-def get_companies_df():
+def get_companies_df(client=None):
+    import pandas as pd
     try:
-        client = get_gcs_client()
+        client = client or get_gcs_client()
         companies_df = load_parquet_from_gcs("raw/companies/companies.parquet", client=client)
     except Exception as e:
         print(f"⚠️ Failed to load from GCS. Fetching from source instead.\n{e}")
-        companies_df = get_companies(ERROR_LOG_FILE)
+        parquet_buffer = get_companies(ERROR_LOG_FILE, UNIVERSE_EXCHANGES, UNIVERSE_TYPES)
+        companies_df = pd.read_parquet(parquet_buffer) if parquet_buffer else None
     
     return companies_df
 
-def main():
-    parquet_buffer = get_companies(ERROR_LOG_FILE)
+def main(client=None):
+    """Refresh the companies list in GCS and return it as a DataFrame."""
+    import pandas as pd
+    parquet_buffer = get_companies(ERROR_LOG_FILE, UNIVERSE_EXCHANGES, UNIVERSE_TYPES)
     if parquet_buffer:
-        client = get_gcs_client()
+        companies_df = pd.read_parquet(parquet_buffer)
+        client = client or get_gcs_client()
         upload_bytes_to_gcs(parquet_buffer, "raw/companies/companies.parquet", client=client)
         print("Companies data uploaded to GCS successfully.")
+        return companies_df
+    return None
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,12 @@
 import os
-import time
 import json
-import pandas as pd
-from vnstock import Vnstock, Company
 from datetime import datetime
-from functools import wraps
-import re
 import traceback
 import io
 from concurrent.futures import ThreadPoolExecutor
+from retry_policy import RetryPolicy, CircuitOpenError, DeferredItems
+from rate_limiter import RateLimiter
+from response_archive import ResponseArchive
 
 def log_error(err_file_path, message):
     """Log errors with timestamp to the specified error file."""
@@ -49,37 +47,41 @@ def append_json(file_path, data, is_last=False):
         else:
             f.write(",\n")
 
-def retry_on_error(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        delays = [10, 30, 60]
-        for attempt in range(len(delays) + 1):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                wait_time = delays[attempt] if attempt < len(delays) else None
-
-                # Check if it's a VCI rate limit message
-                msg = str(e)
-                match = re.search(r"thử lại sau (\d+) giây", msg)
-                if match:
-                    wait_time = int(match.group(1)) + 2  # give buffer
-
-                if wait_time and attempt < len(delays):
-                    error_message = f"Retry {attempt + 1} for {func.__name__} due to error: {e}"
-                    print(error_message)
-                    log_error(args[-1], error_message)
-                    time.sleep(wait_time)
-                else:
-                    raise e
-    return wrapper
-
-def get_companies(err_file_path):
-    """Fetch the list of companies and return as in-memory Parquet bytes."""
+# Shared retry policy: classifies errors as rate-limit / transient / permanent and
+# keeps a circuit breaker per endpoint (the decorated function name).
+retry_policy = RetryPolicy(log_error=log_error)
+retry_on_error = retry_policy
+
+def wait_for_slot(rate_limiter, *endpoints):
+    """
+    Wait for a rate-limiter slot before calling `endpoints`. If one of their circuits is
+    open, CircuitOpenError is raised at once, so a deferred item does not hold up the limiter.
+    """
+    retry_policy.check(*endpoints)
+    rate_limiter.wait()
+
+# Every raw API response goes through the archive; replay swaps in one that reads it back
+response_archive = ResponseArchive()
+
+# vnstock and pandas are imported by the functions that use them rather than at module
+# level: their imports are slow (and vnstock's has start-up side effects), and commands
+# that never hit the API or touch a DataFrame should not pay for them.
+def new_company(symbol):
+    from vnstock import Company
+    return Company(symbol=symbol)
+
+def new_stock(symbol):
+    from vnstock import Vnstock
+    return Vnstock().stock(symbol=symbol, source='VCI')
+
+def get_companies(err_file_path, exchanges=("HSX",), types=("STOCK",)):
+    """Fetch the list of companies on the given exchanges and return as in-memory Parquet bytes."""
+    import pandas as pd
     try:
-        stock = Vnstock().stock(symbol='ACB', source='VCI')
-        companies = pd.DataFrame(stock.listing.symbols_by_exchange())
-        companies_df = companies[(companies['exchange'] == 'HSX') & (companies['type'] == 'STOCK')]
+        listing = response_archive.call("listing.symbols_by_exchange", None,
+                                        lambda: new_stock('ACB').listing.symbols_by_exchange())
+        companies = pd.DataFrame(listing)
+        companies_df = companies[companies['exchange'].isin(exchanges) & companies['type'].isin(types)]
         companies_df = companies_df.drop(columns=['organ_short_name', 'organ_name'], axis=1)
 
         buffer = io.BytesIO()
@@ -98,9 +100,8 @@ def get_companies(err_file_path):
 @retry_on_error
 def fetch_company_info(symbol, err_file_path):
     """Fetch company overview and profile data for a symbol."""
-    company = Company(symbol=symbol)
-    overview = company.overview()
-    profile = company.profile()
+    overview = response_archive.call("company.overview", symbol, lambda: new_company(symbol).overview())
+    profile = response_archive.call("company.profile", symbol, lambda: new_company(symbol).profile())
     info = {
         "symbol": symbol,
         "exchange": overview.get("exchange")[0],
@@ -120,19 +121,28 @@ def fetch_company_info(symbol, err_file_path):
     }
     return info
 
-def get_company_info(companies_df, err_file_path, is_test=True):
-    """Fetch company info and return a BytesIO parquet buffer."""
+def get_company_info(companies_df, err_file_path, is_test=True, rate_limiter=None):
+    """Fetch company info; returns a BytesIO parquet buffer and the symbols that were fetched."""
+    import pandas as pd
     print('Start collecting company info')
     if is_test:
         companies_df = companies_df.head(10)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(interval=5)
 
     company_infos = []
-    for symbol in companies_df['symbol']:
+    crawled = []
+    symbols = DeferredItems(companies_df['symbol'])
+    for symbol in symbols:
         try:
+            wait_for_slot(rate_limiter, "fetch_company_info")
             info = fetch_company_info(symbol, err_file_path)
             company_infos.append(info)
+            crawled.append(symbol)
             print(f"Collected info for {symbol}")
-            time.sleep(5)
+        except CircuitOpenError as e:
+            if not symbols.defer(symbol, e):
+                log_error(err_file_path, f"Gave up on {symbol}: {e}")
         except Exception as e:
             error_message = f"Error fetching data for {symbol}: {e}\n{traceback.format_exc()}"
             log_error(err_file_path, error_message)
@@ -142,7 +152,7 @@ def get_company_info(companies_df, err_file_path, is_test=True):
         error_message = "No data collected."
         log_error(err_file_path, error_message)
         print(error_message)
-        return None
+        return None, crawled
 
     # Convert to parquet in memory
     df = pd.DataFrame(company_infos)
@@ -151,30 +161,38 @@ def get_company_info(companies_df, err_file_path, is_test=True):
     buffer.seek(0)
     
     print("Company info data prepared in-memory as Parquet")
-    return buffer
+    return buffer, crawled
 
 @retry_on_error
 def fetch_officers(symbol, err_file_path):
     """Fetch officers data for a symbol."""
-    company = Company(symbol=symbol)
-    return company.officers()
+    return response_archive.call("company.officers", symbol, lambda: new_company(symbol).officers())
 
-def get_officers(companies_df, err_file_path, is_test=True):
-    """Fetch company officers and return a BytesIO parquet buffer."""
+def get_officers(companies_df, err_file_path, is_test=True, rate_limiter=None):
+    """Fetch company officers; returns a BytesIO parquet buffer and the symbols that were fetched."""
+    import pandas as pd
     print('Start collecting officers data')
     if is_test:
         companies_df = companies_df.head(10)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(interval=5)
 
     df = pd.DataFrame()
-    for symbol in companies_df['symbol']:
+    crawled = []
+    symbols = DeferredItems(companies_df['symbol'])
+    for symbol in symbols:
         try:
+            wait_for_slot(rate_limiter, "fetch_officers")
             officers = fetch_officers(symbol, err_file_path)
             officers['symbol'] = symbol  # Add the symbol column
             cols = ['symbol'] + [col for col in officers.columns if col != 'symbol']  # Reorder columns
             officers = officers[cols]
             df = pd.concat([df, officers], ignore_index=True)
+            crawled.append(symbol)
             print(f"Collected officers data for {symbol}")
-            time.sleep(5)
+        except CircuitOpenError as e:
+            if not symbols.defer(symbol, e):
+                log_error(err_file_path, f"Gave up on {symbol}: {e}")
         except Exception as e:
             error_message = f"Error fetching officers data for {symbol}: {e}\n{traceback.format_exc()}"
             log_error(err_file_path, error_message)
@@ -183,7 +201,7 @@ def get_officers(companies_df, err_file_path, is_test=True):
         error_message = "No officers data collected."
         log_error(err_file_path, error_message)
         print(error_message)
-        return None
+        return None, crawled
 
     # Convert to Parquet in memory
     buffer = io.BytesIO()
@@ -191,30 +209,38 @@ def get_officers(companies_df, err_file_path, is_test=True):
     buffer.seek(0)
 
     print("Officers data prepared in-memory as Parquet")
-    return buffer
+    return buffer, crawled
 
 @retry_on_error
 def fetch_shareholders(symbol, err_file_path):
     """Fetch shareholders data for a symbol."""
-    company = Company(symbol=symbol)
-    return company.shareholders()
+    return response_archive.call("company.shareholders", symbol, lambda: new_company(symbol).shareholders())
 
-def get_shareholders(companies_df, err_file_path, is_test=True):
-    """Fetch company shareholders and return a BytesIO parquet buffer."""
+def get_shareholders(companies_df, err_file_path, is_test=True, rate_limiter=None):
+    """Fetch company shareholders; returns a BytesIO parquet buffer and the symbols that were fetched."""
+    import pandas as pd
     print('Start collecting shareholders data')
     if is_test:
         companies_df = companies_df.head(10)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(interval=5)
 
     df = pd.DataFrame()
-    for symbol in companies_df['symbol']:
+    crawled = []
+    symbols = DeferredItems(companies_df['symbol'])
+    for symbol in symbols:
         try:
+            wait_for_slot(rate_limiter, "fetch_shareholders")
             shareholders = fetch_shareholders(symbol, err_file_path)
             shareholders['symbol'] = symbol  # Add the symbol column
             cols = ['symbol'] + [col for col in shareholders.columns if col != 'symbol']  # Reorder columns
             shareholders = shareholders[cols]
             df = pd.concat([df, shareholders], ignore_index=True)
+            crawled.append(symbol)
             print(f"Collected shareholders data for {symbol}")
-            time.sleep(5)
+        except CircuitOpenError as e:
+            if not symbols.defer(symbol, e):
+                log_error(err_file_path, f"Gave up on {symbol}: {e}")
         except Exception as e:
             error_message = f"Error fetching shareholders data for {symbol}: {e}\n{traceback.format_exc()}"
             log_error(err_file_path, error_message)
@@ -224,7 +250,7 @@ def get_shareholders(companies_df, err_file_path, is_test=True):
         error_message = "No shareholders data collected."
         log_error(err_file_path, error_message)
         print(error_message)
-        return None
+        return None, crawled
 
     # Convert to Parquet in memory
     buffer = io.BytesIO()
@@ -232,223 +258,135 @@ def get_shareholders(companies_df, err_file_path, is_test=True):
     buffer.seek(0)
 
     print("Shareholders data prepared in-memory as Parquet")
-    return buffer
+    return buffer, crawled
 
 @retry_on_error
 def fetch_dividends(symbol, err_file_path):
     """Fetch dividends data for a symbol."""
-    company = Company(symbol=symbol)
-    return company.dividends()
-
-def get_dividends(companies_df, err_file_path, is_test=True):
-    """Fetch company dividends and return a dict of year -> BytesIO parquet buffer."""
-    print("Start collecting dividends data")
-    if is_test:
-        companies_df = companies_df.head(10)
-
-    all_dividends = pd.DataFrame()
-
-    for symbol in companies_df['symbol']:
-        try:
-            dividends = fetch_dividends(symbol, err_file_path)
-            dividends['symbol'] = symbol
-            cols = ['symbol'] + [col for col in dividends.columns if col != 'symbol']
-            dividends = dividends[cols]
-            if 'exercise_date' not in dividends:
-                log_error(err_file_path, f"exercise_date not found in dividends for {symbol}")
-                continue
-
-            dividends['exercise_date'] = pd.to_datetime(dividends['exercise_date'], errors='coerce')
-            dividends.dropna(subset=['exercise_date'], inplace=True)
-            dividends['year'] = dividends['exercise_date'].dt.year
-
-            all_dividends = pd.concat([all_dividends, dividends], ignore_index=True)
-            # print(dividends.head())
-            print(f"Collected dividends data for {symbol}")
-            time.sleep(5)
-
-        except Exception as e:
-            error_message = f"Error fetching dividends data for {symbol}: {e}\n{traceback.format_exc()}"
-            log_error(err_file_path, error_message)
-            print(error_message)
-
-    if all_dividends.empty:
-        error_message = "No dividends data collected."
-        log_error(err_file_path, error_message)
-        print(error_message)
+    return response_archive.call("company.dividends", symbol, lambda: new_company(symbol).dividends())
+
+def collect_dividends(symbol, err_file_path):
+    """Fetch one symbol's dividends with a `year` column, or None if it has no exercise dates."""
+    import pandas as pd
+    dividends = fetch_dividends(symbol, err_file_path)
+    dividends['symbol'] = symbol
+    cols = ['symbol'] + [col for col in dividends.columns if col != 'symbol']
+    dividends = dividends[cols]
+    if 'exercise_date' not in dividends:
+        log_error(err_file_path, f"exercise_date not found in dividends for {symbol}")
         return None
 
+    dividends['exercise_date'] = pd.to_datetime(dividends['exercise_date'], errors='coerce')
+    dividends.dropna(subset=['exercise_date'], inplace=True)
+    dividends['year'] = dividends['exercise_date'].dt.year
+    return dividends
+
+def parquet_buffers_by_year(df):
+    """Split rows with `symbol` and `year` columns into one parquet buffer per (symbol, year)."""
     buffers = {}
-    for (symbol, year), group in all_dividends.groupby(['symbol', 'year']):
+    for (symbol, year), group in df.groupby(['symbol', 'year']):
         group = group.drop(columns='year')
-        # print(group.head())
         buffer = io.BytesIO()
         group.to_parquet(buffer, index=False)
         buffer.seek(0)
         buffers[(symbol, year)] = buffer
-        
-    print("Dividends data prepared in-memory as Parquet")
     return buffers
 
-
 @retry_on_error
 def fetch_stock_quote_history(symbol, start_date, end_date, err_file_path):
     """Fetch stock quote history data for a symbol."""  
-    stock = Vnstock().stock(symbol=symbol, source='VCI')
-    quote_history = stock.quote.history(start=start_date, end=end_date)
+    import pandas as pd
+    quote_history = response_archive.call(
+        "quote.history", symbol, lambda: new_stock(symbol).quote.history(start=start_date, end=end_date),
+        start=start_date, end=end_date)
     return pd.DataFrame(quote_history)
 
-def get_stock_quote_history(companies_df, err_file_path, start_date="2020-01-01", end_date=None, is_test=True):
-    """Fetch and return stock quote history data grouped by symbol and year."""
-    print('Start collecting stock quote history data')
-    if end_date is None:
-        end_date = datetime.today().strftime("%Y-%m-%d")
-    if is_test:
-        companies_df = companies_df.head(10)
-
-    all_quotes = pd.DataFrame()
-
-    for symbol in companies_df['symbol']:
-        try:
-            # Fetch stock quote history for the symbol
-            quote_history_df = fetch_stock_quote_history(symbol, start_date, end_date, err_file_path)
-            quote_history_df['symbol'] = symbol
-            cols = ['symbol'] + [col for col in quote_history_df.columns if col != 'symbol']
-            quote_history_df = quote_history_df[cols]
-            
-            # Extract year from the date column
-            if 'time' in quote_history_df.columns:
-                quote_history_df['time'] = pd.to_datetime(quote_history_df['time'], errors='coerce')
-                quote_history_df.dropna(subset=['time'], inplace=True)
-                quote_history_df['year'] = quote_history_df['time'].dt.year
-            else:
-                print(f"No 'date' column found for symbol {symbol}. Skipping.")
-                continue
-
-            all_quotes = pd.concat([all_quotes, quote_history_df], ignore_index=True)
-            print(f"Collected stock quote history for {symbol}")
-            time.sleep(5)
-        except Exception as e:
-            error_message = f"Error fetching stock quote history for {symbol}: {e}"
-            log_error(err_file_path, error_message)
-            print(error_message)
-
-    if all_quotes.empty:
-        print("No stock quote history data collected.")
+@retry_on_error
+def fetch_intraday(symbol, page_size, err_file_path):
+    """Fetch the latest intraday trades for a symbol."""
+    import pandas as pd
+    stock = new_stock(symbol)
+    intraday = stock.quote.intraday(symbol=symbol, page_size=page_size, show_log=False)
+    return pd.DataFrame(intraday)
+
+def collect_stock_quote_history(symbol, start_date, end_date, err_file_path):
+    """Fetch one symbol's daily bars with a `year` column, or None if they have no time column."""
+    import pandas as pd
+    quote_history_df = fetch_stock_quote_history(symbol, start_date, end_date, err_file_path)
+    quote_history_df['symbol'] = symbol
+    cols = ['symbol'] + [col for col in quote_history_df.columns if col != 'symbol']
+    quote_history_df = quote_history_df[cols]
+
+    # Extract year from the date column
+    if 'time' not in quote_history_df.columns:
+        print(f"No 'date' column found for symbol {symbol}. Skipping.")
         return None
+    quote_history_df['time'] = pd.to_datetime(quote_history_df['time'], errors='coerce')
+    quote_history_df.dropna(subset=['time'], inplace=True)
+    quote_history_df['year'] = quote_history_df['time'].dt.year
+    return quote_history_df
 
-    # Group by symbol and year, and prepare buffers
-    buffers = {}
-    for (symbol, year), group in all_quotes.groupby(['symbol', 'year']):
-        group = group.drop(columns='year')  # Drop the year column before saving
-        buffer = io.BytesIO()
-        group.to_parquet(buffer, index=False)
-        buffer.seek(0)
-        buffers[(symbol, year)] = buffer
-        
-    print("Stock qoute data prepared in-memory as Parquet")
-    return buffers
-
-@retry_on_error
 def fetch_with_retry(named_fetch_funcs, symbol, period, lang, err_file_path):
     """
-    Retry fetching data with exponential backoff and run multiple fetch functions concurrently.
-    Each function is a tuple: (name, function)
+    Run multiple fetch functions concurrently, each as its own call under the retry policy.
+    Each function is a tuple: (name, function); its endpoint is `finance.<name>`.
+
+    Returns name -> result, with None for a function that failed. If any endpoint's circuit
+    is open, CircuitOpenError is raised once every call has finished, so the symbol can be
+    deferred as a whole.
     """
-    stock = Vnstock().stock(symbol=symbol, source='VCI')
+    # Building the VCI stock object calls the API, so a replay skips it
+    stock = None if response_archive.replay else retry_policy.call(
+        new_stock, (symbol,), endpoint="finance.new_stock", err_file_path=err_file_path)
 
     # Define a wrapper to execute each fetch function
-    def execute_fetch(fetch_func):
-        return fetch_func(stock, period=period, lang=lang)
+    def execute_fetch(name, fetch_func):
+        return retry_policy.call(
+            response_archive.call, (f"finance.{name}", symbol, lambda: fetch_func(stock, period=period, lang=lang)),
+            {"period": period, "lang": lang}, endpoint=f"finance.{name}", err_file_path=err_file_path)
 
     # Run all fetch functions concurrently
     results = {}
+    circuit_error = None
     with ThreadPoolExecutor(max_workers=4) as executor:
         future_to_name = {
-            executor.submit(execute_fetch, fetch_func): name
+            executor.submit(execute_fetch, name, fetch_func): name
             for name, fetch_func in named_fetch_funcs
         }
         for future in future_to_name:
             name = future_to_name[future]
             try:
                 results[name] = future.result()
+            except CircuitOpenError as e:
+                circuit_error = circuit_error or e
+                results[name] = None
             except Exception as e:
                 error_message = f"Error fetching data for {symbol} using {name}: {e}"
                 log_error(err_file_path, error_message)
                 print(error_message)
                 results[name] = None
 
+    if circuit_error is not None:
+        raise circuit_error
     return results
 
 
-def get_financial_data(companies_df, err_file_path, period_type="quarter", is_test=True):
+# Financial statements fetched per symbol, by data type
+FINANCIAL_FETCH_FUNCS = [
+    ("income_statement", lambda stock, period, lang: stock.finance.income_statement(period=period, lang=lang)),
+    ("balance_sheet", lambda stock, period, lang: stock.finance.balance_sheet(period=period, lang=lang)),
+    ("cash_flow", lambda stock, period, lang: stock.finance.cash_flow(period=period, lang=lang)),
+    ("ratio", lambda stock, period, lang: stock.finance.ratio(period=period, lang=lang)),
+]
+FINANCIAL_ENDPOINTS = ["finance.new_stock"] + [f"finance.{name}" for name, _ in FINANCIAL_FETCH_FUNCS]
+
+def collect_financial_data(symbol, err_file_path, period_type="quarter"):
     """
-    Fetch financial data (income statement, balance sheet, cash flow, financial ratio)
-    for a list of companies and return a dictionary of buffers categorized by data_type and symbol.
+    Fetch every financial statement of one symbol; returns data_type -> DataFrame, without
+    failed types. Raises if no statement came back, so the symbol is not counted as crawled.
     """
-    print("Start collecting financial data")
-    if is_test:
-        companies_df = companies_df.head(10)
-
-    # Define fetch functions for each financial data type
-    # Define fetch functions with proper names
-    fetch_funcs = [
-        ("income_statement", lambda stock, period, lang: stock.finance.income_statement(period=period, lang=lang)),
-        ("balance_sheet", lambda stock, period, lang: stock.finance.balance_sheet(period=period, lang=lang)),
-        ("cash_flow", lambda stock, period, lang: stock.finance.cash_flow(period=period, lang=lang)),
-        ("ratio", lambda stock, period, lang: stock.finance.ratio(period=period, lang=lang)),
-    ]
-
-    # Initialize the result dictionary
-    result = {key: {} for key, _ in fetch_funcs}
-
-    for symbol in companies_df['symbol']:
-        try:
-            # Fetch all financial data types concurrently for the symbol
-            data = fetch_with_retry(fetch_funcs, 
-                                    symbol, period=period_type, lang='vi', err_file_path=err_file_path)
-
-            for data_type in data.items():
-                if data_type is not None:
-                    buffer = io.BytesIO()
-                    data_type[1].to_parquet(buffer, index=False)
-                    buffer.seek(0)
-                    result[data_type[0]][symbol] = buffer
-
-            print(f"Collected financial data for {symbol}")
-            time.sleep(10)
-        except Exception as e:
-            error_message = f"Error fetching financial data for {symbol}: {e}"
-            log_error(err_file_path, error_message)
-            print(error_message)
-
-    print("Finished collecting financial data")
-    return result
-
-def get_income_statement(companies_df, err_file_path, quarter=True, is_test=True):
-    """Fetch and return income statement data as buffers grouped by symbol and year."""
-    period = 'quarter' if quarter else 'year'
-    return get_financial_data(
-        companies_df, err_file_path, period_type=period, is_test=is_test
-    )
-
-def get_balance_sheet(companies_df, err_file_path, quarter=True, is_test=True):
-    """Fetch and return balance sheet data as buffers grouped by symbol and year."""
-    period = 'quarter' if quarter else 'year'
-    return get_financial_data(
-        companies_df, err_file_path, period_type=period, is_test=is_test
-    )
-
-def get_cash_flow(companies_df, err_file_path, quarter=True, is_test=True):
-    """Fetch and return cash flow data as buffers grouped by symbol and year."""
-    period = 'quarter' if quarter else 'year'
-    return get_financial_data(
-        companies_df, err_file_path, period_type=period, is_test=is_test
-    )
-
-def get_ratio(companies_df, err_file_path, quarter=True, is_test=True):
-    """Fetch and return financial ratio data as buffers grouped by symbol and year."""
-    period = 'quarter' if quarter else 'year'
-    return get_financial_data(
-        companies_df, err_file_path, period_type=period, is_test=is_test
-    )
+    data = fetch_with_retry(FINANCIAL_FETCH_FUNCS, symbol, period=period_type, lang='vi', err_file_path=err_file_path)
+    statements = {data_type: df for data_type, df in data.items() if df is not None}
+    if not statements:
+        raise RuntimeError(f"No financial statements fetched for {symbol}")
+    return statements
@@ -1,7 +1,8 @@
 import os
-from data_utils import get_dividends
+from data_utils import collect_dividends, parquet_buffers_by_year, log_error, wait_for_slot
 from gcs_utils import upload_bytes_to_gcs, get_gcs_client
-from companies import get_companies_df
+from pipeline import run_pipeline
+from rate_limiter import RateLimiter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,20 +11,36 @@ load_dotenv()
 ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
 IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
 
-def main(is_test):
-    companies_df = get_companies_df()
+def main(is_test, companies_df=None, client=None, rate_limiter=None):
+    """Crawl dividend history; returns the symbols that were crawled and uploaded."""
+    if companies_df is None:
+        from companies import get_companies_df
+        companies_df = get_companies_df()
+    if is_test:
+        companies_df = companies_df.head(10)
+    rate_limiter = rate_limiter or RateLimiter(interval=5)
+    client = client or get_gcs_client()
 
-    # Fetch dividends data grouped by symbol and year
-    buffers = get_dividends(companies_df, ERROR_LOG_FILE, is_test)
+    # Fetch, encode per (symbol, year) and upload as overlapping stages
+    def fetch(symbol):
+        wait_for_slot(rate_limiter, "fetch_dividends")
+        return collect_dividends(symbol, ERROR_LOG_FILE)
 
-    if buffers:
-        client = get_gcs_client()
-        for (symbol, year), buffer in buffers.items():
-            file_path = f"raw/dividends/{symbol}/dividends_{year}.parquet"
-            upload_bytes_to_gcs(buffer, file_path, client=client)
+    def encode(symbol, dividends):
+        return [(f"raw/dividends/{symbol}/dividends_{year}.parquet", buffer)
+                for (_, year), buffer in parquet_buffers_by_year(dividends).items()]
+
+    def upload(file_path, buffer):
+        upload_bytes_to_gcs(buffer, file_path, client=client)
+
+    stats, crawled = run_pipeline(companies_df['symbol'], fetch, encode, upload, label="dividends",
+                         err_file_path=ERROR_LOG_FILE, log_error=log_error)
+
+    if stats["upload"].items:
         print("Uploaded in-memory Parquet files to GCS successfully.")
     else:
         print("Failed to fetch any dividends data.")
+    return crawled
 
 if __name__ == "__main__":
     # parser = argparse.ArgumentParser(description="Run the Dividends Service pipeline.")
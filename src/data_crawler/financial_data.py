@@ -1,7 +1,9 @@
+import io
 import os
-from companies import get_companies_df
-from data_utils import get_financial_data
+from data_utils import FINANCIAL_ENDPOINTS, collect_financial_data, log_error, wait_for_slot
 from gcs_utils import upload_bytes_to_gcs, get_gcs_client
+from pipeline import run_pipeline
+from rate_limiter import RateLimiter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,22 +13,42 @@ ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
 IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
     
 
-def main(is_test):
+def main(is_test, companies_df=None, client=None, rate_limiter=None):
+    """Crawl financial statements and ratios; returns the symbols that were crawled and uploaded."""
     # Get the companies DataFrame
-    companies_df = get_companies_df()
+    if companies_df is None:
+        from companies import get_companies_df
+        companies_df = get_companies_df()
+    if is_test:
+        companies_df = companies_df.head(10)
+    rate_limiter = rate_limiter or RateLimiter(interval=10)
+    client = client or get_gcs_client()
 
-    # Fetch and upload financial data
-    financial_data = get_financial_data(companies_df, ERROR_LOG_FILE, period_type="quarter", is_test=is_test)
+    # Each symbol's statements are encoded and uploaded while the next symbol is fetched
+    def fetch(symbol):
+        wait_for_slot(rate_limiter, *FINANCIAL_ENDPOINTS)
+        return collect_financial_data(symbol, ERROR_LOG_FILE, period_type="quarter")
 
-    if financial_data:
-        client = get_gcs_client()
-        for data_type, buffers in financial_data.items():
-            for symbol, buffer in buffers.items():
-                file_path = f"raw/{data_type}/{symbol}/{data_type}.parquet"
-                upload_bytes_to_gcs(buffer, file_path, client=client)
+    def encode(symbol, statements):
+        outputs = []
+        for data_type, df in statements.items():
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            buffer.seek(0)
+            outputs.append((f"raw/{data_type}/{symbol}/{data_type}.parquet", buffer))
+        return outputs
+
+    def upload(file_path, buffer):
+        upload_bytes_to_gcs(buffer, file_path, client=client)
+
+    stats, crawled = run_pipeline(companies_df['symbol'], fetch, encode, upload, label="financial_data",
+                         err_file_path=ERROR_LOG_FILE, log_error=log_error)
+
+    if stats["upload"].items:
         print("Uploaded in-memory Parquet files to GCS successfully.")
     else:
         print("Failed to fetch financial data.")
+    return crawled
 
 if __name__ == "__main__":
     # parser = argparse.ArgumentParser(description="Run the Financial Data Service pipeline.")
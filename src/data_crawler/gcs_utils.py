@@ -1,6 +1,4 @@
-from google.cloud import storage
 import os
-import pandas as pd
 from dotenv import load_dotenv
 import io
 
@@ -14,6 +12,9 @@ def get_gcs_client(credentials_path=None):
     """
     Initialize a GCS client using provided service account credentials or default credentials.
     """
+    # Imported here so that modules using gcs_utils load fast when no client is needed
+    from google.cloud import storage
+
     if credentials_path:
         return storage.Client.from_service_account_json(credentials_path)
     return storage.Client()  # Uses GOOGLE_APPLICATION_CREDENTIALS env var if set
@@ -76,6 +77,7 @@ def load_parquet_from_gcs(blob_name, credentials_path=None, client=None):
     Returns:
         pd.DataFrame: The loaded DataFrame from parquet in memory.
     """
+    import pandas as pd
     if not BUCKET_NAME:
         raise ValueError("❌ GCS_BUCKET not set in environment variables!")
 
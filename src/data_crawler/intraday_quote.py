@@ -0,0 +1,382 @@
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from data_utils import fetch_intraday, log_error, wait_for_slot
+from gcs_utils import upload_bytes_to_gcs, get_gcs_client
+from rate_limiter import RateLimiter
+from response_archive import stop_on_sigterm
+from retry_policy import CircuitOpenError
+
+load_dotenv()
+
+# Environment variables
+ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
+IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
+
+# HOSE trading sessions: morning from the 09:00 ATO, lunch break 11:30-13:00, and the
+# afternoon until the 14:45 ATC (stop polling a little after). Nothing trades outside them.
+MARKET_SESSIONS = [("09:00", "11:30"), ("13:00", "15:00")]
+
+# Longest the stream loop sleeps without checking the clock, the schedule and the batcher
+MAX_WAIT_SECONDS = 1.0
+
+
+class VnstockTickSource:
+    """Poll the latest intraday trades of a symbol from vnstock (VCI)."""
+
+    def __init__(self, page_size=500, rate_limiter=None, err_file_path=ERROR_LOG_FILE):
+        self.page_size = page_size
+        self.rate_limiter = rate_limiter or RateLimiter(interval=0.2)
+        self.err_file_path = err_file_path
+
+    def poll(self, symbol):
+        wait_for_slot(self.rate_limiter, "fetch_intraday")
+        ticks = fetch_intraday(symbol, self.page_size, self.err_file_path)
+        ticks["symbol"] = symbol
+        return ticks
+
+
+class FakeTickSource:
+    """
+    Offline tick source for replaying and load-testing the stream.
+
+    Every poll returns the last `overlap` trades of the previous poll again plus
+    `ticks_per_poll` new ones, the same way a real "latest N trades" endpoint does.
+    """
+
+    def __init__(self, ticks_per_poll=20, overlap=10, seed=0):
+        self.ticks_per_poll = ticks_per_poll
+        self.overlap = overlap
+        self.rng = np.random.default_rng(seed)
+        self.start_time = pd.Timestamp.now().floor("s")
+        self.last_id = {}
+        self.last_price = {}
+        self._lock = threading.Lock()
+
+    def poll(self, symbol):
+        with self._lock:
+            start_id = max(self.last_id.get(symbol, 0) - self.overlap, 0)
+            end_id = self.last_id.get(symbol, 0) + self.ticks_per_poll
+            self.last_id[symbol] = end_id
+
+            n = end_id - start_id
+            price = self.last_price.get(symbol, 20.0) + np.cumsum(self.rng.normal(0, 0.05, n))
+            self.last_price[symbol] = float(price[-1])
+            volume = self.rng.integers(1, 100, n) * 100
+            match_type = self.rng.choice(["Buy", "Sell"], n)
+
+        trade_ids = np.arange(start_id, end_id)
+        return pd.DataFrame({
+            # Two trades per 10 ms share a timestamp, like real matches in the same tick
+            "time": self.start_time + pd.to_timedelta(trade_ids // 2 * 10, unit="ms"),
+            "price": price.round(2),
+            "volume": volume,
+            "match_type": match_type,
+            "id": trade_ids.astype(str),
+            "symbol": symbol,
+        })
+
+
+class TickDeduplicator:
+    """
+    Drop trades that were already seen.
+
+    The source returns the latest N trades, so each symbol only needs a watermark:
+    the newest trade time seen so far plus the keys of the trades at exactly that
+    time (several trades can share a timestamp). Trades are keyed by `id`, or by
+    price/volume when the source has no id. Memory stays constant per symbol, and
+    a whole polling round is filtered with a few vectorized operations.
+    """
+
+    def __init__(self):
+        self.last_time = {}
+        self.last_keys = {}
+
+    def filter(self, ticks):
+        if ticks.empty:
+            return ticks
+        times = pd.to_datetime(ticks["time"])
+        if "id" in ticks.columns:
+            keys = ticks["id"].astype(str)
+        else:
+            keys = ticks["price"].astype(str) + "|" + ticks["volume"].astype(str)
+
+        last_time = pd.to_datetime(ticks["symbol"].map(self.last_time))
+        is_new = (last_time.isna() | (times > last_time)).to_numpy().copy()
+        at_watermark = (times == last_time).to_numpy()
+        if at_watermark.any():
+            symbols = ticks["symbol"].to_numpy()
+            key_values = keys.to_numpy()
+            for i in np.flatnonzero(at_watermark):
+                is_new[i] = key_values[i] not in self.last_keys[symbols[i]]
+
+        newest = times.groupby(ticks["symbol"]).transform("max")
+        at_newest = times == newest
+        for symbol, group_keys in keys[at_newest].groupby(ticks["symbol"][at_newest]):
+            time_ = newest[group_keys.index[0]]
+            if self.last_time.get(symbol) == time_:
+                self.last_keys[symbol].update(group_keys)
+            elif symbol not in self.last_time or time_ > self.last_time[symbol]:
+                self.last_time[symbol] = time_
+                self.last_keys[symbol] = set(group_keys)
+        return ticks[is_new]
+
+
+class GCSSink:
+    def __init__(self, client=None):
+        self.client = client or get_gcs_client()
+
+    def write(self, path, buffer):
+        upload_bytes_to_gcs(buffer, path, client=self.client)
+
+
+class LocalSink:
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, path, buffer):
+        file_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(buffer.getbuffer())
+
+
+class MicroBatcher:
+    """
+    Buffer new ticks and flush them as time-partitioned parquet files.
+
+    A batch is flushed when it holds `max_rows` ticks or when its oldest tick has
+    waited `max_latency` seconds, so both memory and flush latency are bounded.
+    Files go to raw/intraday/date=YYYY-MM-DD/hour=HH/ by trade time.
+    """
+
+    def __init__(self, sink, max_rows=50_000, max_latency=30.0):
+        self.sink = sink
+        self.max_rows = max_rows
+        self.max_latency = max_latency
+        self.pending = []
+        self.pending_rows = 0
+        self.oldest_arrival = None
+        self.batch_seq = 0
+        self.metrics = []
+
+    def add(self, ticks):
+        if ticks.empty:
+            return
+        if self.oldest_arrival is None:
+            self.oldest_arrival = time.monotonic()
+        self.pending.append(ticks)
+        self.pending_rows += len(ticks)
+        if self.pending_rows >= self.max_rows:
+            self.flush()
+
+    def due(self):
+        return self.oldest_arrival is not None and time.monotonic() - self.oldest_arrival >= self.max_latency
+
+    def seconds_until_due(self):
+        """Seconds until the pending batch must be flushed, or None if nothing is pending."""
+        if self.oldest_arrival is None:
+            return None
+        return max(0.0, self.max_latency - (time.monotonic() - self.oldest_arrival))
+
+    def flush(self):
+        if not self.pending:
+            return None
+        batch = pd.concat(self.pending, ignore_index=True)
+        buffered_seconds = time.monotonic() - self.oldest_arrival
+        self.pending, self.pending_rows, self.oldest_arrival = [], 0, None
+
+        self.batch_seq += 1
+        times = pd.to_datetime(batch["time"])
+        stamp = datetime.now().strftime("%H%M%S")
+        for (day, hour), group in batch.groupby([times.dt.strftime("%Y-%m-%d"), times.dt.hour]):
+            buffer = io.BytesIO()
+            group.to_parquet(buffer, index=False)
+            buffer.seek(0)
+            self.sink.write(f"raw/intraday/date={day}/hour={hour:02d}/ticks_{stamp}_{self.batch_seq:05d}.parquet",
+                            buffer)
+
+        newest_trade = times.max()
+        now = pd.Timestamp.now(tz=newest_trade.tz) if newest_trade.tz else pd.Timestamp.now()
+        metric = {
+            "batch": self.batch_seq,
+            "rows": len(batch),
+            "buffered_seconds": round(buffered_seconds, 3),
+            "event_lag_seconds": round((now - newest_trade).total_seconds(), 3),
+        }
+        self.metrics.append(metric)
+        print(f"🧾 Batch {metric['batch']}: {metric['rows']} ticks, buffered {metric['buffered_seconds']}s, "
+              f"event lag {metric['event_lag_seconds']}s")
+        return metric
+
+
+def market_sessions(day, sessions=MARKET_SESSIONS):
+    """(open, close) datetimes of the trading sessions on `day`."""
+    return [(datetime.combine(day, datetime.strptime(start, "%H:%M").time()),
+             datetime.combine(day, datetime.strptime(end, "%H:%M").time())) for start, end in sessions]
+
+
+def run_stream(source, symbols, batcher, poll_interval=3.0, max_workers=8, until=None, max_polls=None,
+               sessions=None, err_file_path=ERROR_LOG_FILE):
+    """
+    Poll every symbol every `poll_interval` seconds on a thread pool, dedup the trades
+    and feed them to the micro-batcher, until `until` (a datetime) or `max_polls` polls
+    per symbol. Each symbol is scheduled on its own, and polls are handled as they
+    complete, so a slow round does not hold back the batcher: it is checked whenever a
+    poll finishes and at least when its `max_latency` runs out. With `sessions` ((open,
+    close) datetimes), symbols are only polled while a session is open. A poll refused by
+    an open circuit breaker is skipped and the symbol is tried again after the cooldown.
+    Returns counters for the run.
+    """
+    dedup = TickDeduplicator()
+    stats = {"polls": 0, "ticks": 0, "new_ticks": 0, "errors": 0, "skipped": 0}
+    polls = dict.fromkeys(symbols, 0)
+    next_poll = dict.fromkeys(symbols, time.monotonic())
+    in_flight = {}
+    market_open = None
+    circuit_open = False
+
+    def poll(symbol):
+        try:
+            return source.poll(symbol)
+        except CircuitOpenError as e:
+            return e
+        except Exception as e:
+            error_message = f"Error polling intraday ticks for {symbol}: {e}\n{traceback.format_exc()}"
+            if err_file_path:
+                log_error(err_file_path, error_message)
+            print(error_message)
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                now = time.monotonic()
+                clock = datetime.now()
+                if until is None or clock < until:
+                    is_open = not sessions or any(start <= clock < end for start, end in sessions)
+                    if sessions and is_open != market_open:
+                        print("🔔 Market open, polling symbols" if is_open
+                              else "💤 Market closed, waiting for the next session")
+                    market_open = is_open
+                    if is_open:
+                        for symbol in [s for s, at in next_poll.items() if at <= now]:
+                            del next_poll[symbol]
+                            in_flight[executor.submit(poll, symbol)] = (symbol, now)
+                else:
+                    next_poll.clear()
+                if not in_flight and not next_poll:
+                    break
+
+                # Wake up for the first completed poll, the next scheduled poll or the batch deadline;
+                # while the market is closed, the clock is checked every MAX_WAIT_SECONDS
+                timeouts = [MAX_WAIT_SECONDS, batcher.seconds_until_due()]
+                if next_poll and market_open:
+                    timeouts.append(min(next_poll.values()) - now)
+                timeout = max(0.0, min(t for t in timeouts if t is not None))
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    time.sleep(timeout)
+
+                frames = []
+                for future in done:
+                    symbol, submitted = in_flight.pop(future)
+                    ticks = future.result()
+                    if isinstance(ticks, CircuitOpenError):
+                        # Not a poll: try again once the breaker lets calls through
+                        stats["skipped"] += 1
+                        next_poll[symbol] = time.monotonic() + max(ticks.retry_in, poll_interval)
+                        if not circuit_open:
+                            circuit_open = True
+                            print(f"⏸️ Skipping polls: {ticks}")
+                        continue
+                    stats["polls"] += 1
+                    polls[symbol] += 1
+                    if max_polls is None or polls[symbol] < max_polls:
+                        next_poll[symbol] = submitted + poll_interval
+                    if ticks is None:
+                        stats["errors"] += 1
+                    else:
+                        circuit_open = False
+                        if not ticks.empty:
+                            frames.append(ticks)
+
+                if frames:
+                    ticks = pd.concat(frames, ignore_index=True)
+                    new_ticks = dedup.filter(ticks)
+                    stats["ticks"] += len(ticks)
+                    stats["new_ticks"] += len(new_ticks)
+                    batcher.add(new_ticks)
+
+                if batcher.due():
+                    batcher.flush()
+    finally:
+        # Also on Ctrl-C / SIGTERM, so buffered ticks are not lost
+        batcher.flush()
+    return stats
+
+
+def replay(num_symbols=200, polls=50, ticks_per_poll=20, max_rows=50_000, max_latency=1.0):
+    """Run the stream against FakeTickSource and a temporary local sink and report throughput."""
+    symbols = [f"S{i:03d}" for i in range(num_symbols)]
+    root = tempfile.mkdtemp(prefix="intraday_replay_")
+    batcher = MicroBatcher(LocalSink(root), max_rows=max_rows, max_latency=max_latency)
+    try:
+        start = time.perf_counter()
+        stats = run_stream(FakeTickSource(ticks_per_poll=ticks_per_poll), symbols, batcher,
+                           poll_interval=0, max_polls=polls, err_file_path=None)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    buffered = [m["buffered_seconds"] for m in batcher.metrics] or [0.0]
+    print(f"\nReplayed {stats['ticks']} ticks ({stats['new_ticks']} new) for {num_symbols} symbols in {seconds:.2f}s")
+    print(f"Throughput: {stats['ticks'] / seconds:,.0f} ticks/s, {len(batcher.metrics)} batches, "
+          f"max buffered {max(buffered):.2f}s")
+    return stats
+
+
+def main(is_test, symbols=None, poll_interval=3.0, max_rows=50_000, max_latency=30.0):
+    if not symbols:
+        from companies import get_companies_df
+        companies_df = get_companies_df()
+        symbols = list(companies_df["symbol"].head(10) if is_test else companies_df["symbol"])
+
+    sessions = market_sessions(datetime.today())
+    until = sessions[-1][1]
+    batcher = MicroBatcher(GCSSink(), max_rows=max_rows, max_latency=max_latency)
+    print(f"Streaming intraday ticks for {len(symbols)} symbols during "
+          f"{', '.join(f'{start}-{end}' for start, end in MARKET_SESSIONS)}")
+    stats = run_stream(VnstockTickSource(), symbols, batcher, poll_interval=poll_interval, until=until,
+                       sessions=sessions)
+    print(f"Finished intraday stream: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream intraday trades into time-partitioned parquet.")
+    parser.add_argument("--symbols", nargs="*", help="Symbols to stream (default: the companies list).")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="Seconds between polls of each symbol.")
+    parser.add_argument("--max-rows", type=int, default=50_000, help="Flush a batch at this many ticks.")
+    parser.add_argument("--max-latency", type=float, default=30.0, help="Flush a batch after this many seconds.")
+    parser.add_argument("--replay", action="store_true", help="Run offline against a fake tick source.")
+    parser.add_argument("--replay-symbols", type=int, default=200)
+    parser.add_argument("--replay-polls", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(args.replay_symbols, args.replay_polls, max_rows=args.max_rows)
+    else:
+        stop_on_sigterm()
+        main(IS_TEST, args.symbols, args.poll_interval, args.max_rows, args.max_latency)
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUEUE_DB = os.getenv("WORKER_QUEUE_DB", "worker_queue.db")
+
+
+class JobQueue:
+    """
+    Local job queue backed by a sqlite file.
+
+    Any process on the host can submit jobs; the worker daemon claims them one at
+    a time inside an IMMEDIATE transaction so a job is never run twice.
+    """
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    dataset TEXT NOT NULL,
+                    symbols TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, kind, dataset, symbols=None):
+        """Queue a job and return its id."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, dataset, symbols, created_at) VALUES (?, ?, ?, ?)",
+                (kind, dataset, json.dumps(symbols) if symbols else None, datetime.now().isoformat()),
+            )
+            return cursor.lastrowid
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None if the queue is empty."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        job = dict(row, status="running")
+        job["symbols"] = json.loads(job["symbols"]) if job["symbols"] else None
+        return job
+
+    def finish(self, job_id, error=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "done", error, datetime.now().isoformat(), job_id),
+            )
+
+    def requeue_running(self):
+        """Put jobs left 'running' by a worker that died back in the queue."""
+        with closing(self._connect()) as conn:
+            return conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'").rowcount
+
+    def recent(self, limit=20):
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit jobs to the worker queue or show their status.")
+    parser.add_argument("--queue", default=QUEUE_DB, help="Path to the sqlite queue file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="Queue a job.")
+    submit_parser.add_argument("dataset", help="Dataset name, e.g. stock_quote.")
+    submit_parser.add_argument("symbols", nargs="*", help="Symbols to refresh (default: all).")
+    submit_parser.add_argument("--kind", choices=["crawl", "clean"], default="crawl")
+
+    subparsers.add_parser("status", help="Show recent jobs.")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.queue)
+    if args.command == "submit":
+        job_id = queue.submit(args.kind, args.dataset, [s.upper() for s in args.symbols])
+        print(f"Queued job {job_id}")
+    else:
+        for job in queue.recent():
+            print(f"{job['id']:>5} {job['status']:<8} {job['kind']:<6} {job['dataset']:<15} "
+                  f"{job['symbols'] or ''} {job['error'] or ''}")
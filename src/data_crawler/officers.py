@@ -1,7 +1,6 @@
 import os
 from data_utils import get_officers
 from gcs_utils import upload_bytes_to_gcs, get_gcs_client
-from companies import get_companies_df
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,18 +8,22 @@ load_dotenv()
 # Environment variables
 ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
 IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
-def main(is_test):
-    companies_df = get_companies_df()
+def main(is_test, companies_df=None, client=None, rate_limiter=None):
+    """Crawl company officers; returns the symbols that were crawled and uploaded."""
+    if companies_df is None:
+        from companies import get_companies_df
+        companies_df = get_companies_df()
 
     # Fetch officers' data and prepare it as a Parquet buffer
-    parquet_buffer = get_officers(companies_df, ERROR_LOG_FILE, is_test)
+    parquet_buffer, crawled = get_officers(companies_df, ERROR_LOG_FILE, is_test, rate_limiter=rate_limiter)
     if parquet_buffer:
-        client = get_gcs_client()
+        client = client or get_gcs_client()
         # Upload the Parquet buffer to GCS
         upload_bytes_to_gcs(parquet_buffer, "raw/officers/officers.parquet", client=client)
         print("Officers data uploaded to GCS successfully.")
     else:
         print("Failed to fetch officers data.")
+    return crawled
 
 if __name__ == "__main__":
     # parser = argparse.ArgumentParser(description="Run the Officers Service pipeline.")
@@ -0,0 +1,229 @@
+import argparse
+import io
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+from dotenv import load_dotenv
+import companies
+import company_info
+import dividends
+import financial_data
+import officers
+import shareholders
+import stock_quote
+from data_utils import get_company_info, get_officers, get_shareholders, log_error
+from gcs_utils import get_gcs_client, upload_bytes_to_gcs, load_parquet_from_gcs
+from rate_limiter import RateLimiter
+from response_archive import stop_on_sigterm
+from scheduler import PriorityScheduler
+
+load_dotenv()
+
+# Environment variables
+ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
+IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
+
+# Datasets stored as one file for all symbols: a partial crawl must merge into the existing file
+SINGLE_FILE_DATASETS = {
+    "company_info": (get_company_info, "raw/company_info/company_info.parquet"),
+    "officers": (get_officers, "raw/officers/officers.parquet"),
+    "shareholders": (get_shareholders, "raw/shareholders/shareholders.parquet"),
+}
+
+
+class CrawlContext:
+    """
+    State shared by every task of one crawl: GCS client, rate limiter, symbol universe
+    and, optionally, the priority scheduler that decides which symbols are due.
+    """
+
+    def __init__(self, is_test, client=None, rate_limiter=None, scheduler=None, max_symbols=None):
+        self.is_test = is_test
+        self.client = client or get_gcs_client()
+        self.rate_limiter = rate_limiter or RateLimiter(interval=1.0)
+        self.scheduler = scheduler
+        self.max_symbols = max_symbols
+        self.companies_df = None
+        self._lock = threading.Lock()
+
+    def universe(self):
+        """Return the companies DataFrame, loading it once if the companies task did not run."""
+        with self._lock:
+            if self.companies_df is None:
+                self.companies_df = companies.get_companies_df(client=self.client)
+            if self.companies_df is None:
+                raise RuntimeError("Companies list is not available")
+            return self.companies_df
+
+    def symbols_for(self, dataset):
+        """Companies to crawl for a dataset: the due symbols in priority order when scheduling is on."""
+        companies_df = self.universe()
+        if self.scheduler is None:
+            return companies_df
+        return self.scheduler.schedule(companies_df, dataset, self.max_symbols)
+
+
+def run_companies(ctx):
+    ctx.companies_df = companies.main(client=ctx.client)
+
+
+def merge_single_file(ctx, dataset, companies_df):
+    """
+    Crawl some symbols of a single-file dataset and merge them into the existing file;
+    returns the symbols that were crawled. Rows of every other symbol are kept as they were.
+    """
+    fetch, gcs_path = SINGLE_FILE_DATASETS[dataset]
+    buffer, crawled = fetch(companies_df, ERROR_LOG_FILE, is_test=ctx.is_test, rate_limiter=ctx.rate_limiter)
+    if buffer is None:
+        print(f"⚠️ No {dataset} data collected, keeping {gcs_path} as it is")
+        return crawled
+
+    fresh_df = pd.read_parquet(buffer)
+    try:
+        existing_df = load_parquet_from_gcs(gcs_path, client=ctx.client)
+        fresh_df = pd.concat([existing_df[~existing_df["symbol"].isin(crawled)], fresh_df], ignore_index=True)
+    except Exception as e:
+        print(f"⚠️ Could not load existing {gcs_path}, writing crawled symbols only.\n{e}")
+
+    buffer = io.BytesIO()
+    fresh_df.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    upload_bytes_to_gcs(buffer, gcs_path, client=ctx.client)
+    return crawled
+
+
+def dataset_task(name, service):
+    """
+    Wrap a service's main() so it runs on the shared context. Only the symbols the
+    service reports as crawled are marked, so failed symbols stay due. When scheduling,
+    single-file datasets get only the due symbols, so they are merged into the existing
+    file instead of replacing it.
+    """
+    def run(ctx):
+        companies_df = ctx.symbols_for(name)
+        if ctx.scheduler is not None and name in SINGLE_FILE_DATASETS:
+            result = merge_single_file(ctx, name, companies_df)
+        else:
+            result = service.main(ctx.is_test, companies_df=companies_df, client=ctx.client,
+                                  rate_limiter=ctx.rate_limiter)
+        if ctx.scheduler is not None:
+            crawled, quotes_df = result if name == "stock_quote" else (result, None)
+            ctx.scheduler.mark_crawled(name, crawled)
+            if quotes_df is not None:
+                ctx.scheduler.update_from_quotes(quotes_df)
+    return run
+
+
+# Dataset name -> crawl service module; every service depends on the companies list
+SERVICES = {
+    "company_info": company_info,
+    "officers": officers,
+    "shareholders": shareholders,
+    "dividends": dividends,
+    "stock_quote": stock_quote,
+    "financial_data": financial_data,
+}
+
+# name -> (dependencies, task function)
+TASKS = {"companies": ([], run_companies)}
+TASKS.update({name: (["companies"], dataset_task(name, service)) for name, service in SERVICES.items()})
+
+
+def select_tasks(only=None, skip=None):
+    """Return task names to run, in TASKS order."""
+    names = [name for name in TASKS if not only or name in only]
+    return [name for name in names if not skip or name not in skip]
+
+
+def run_dag(ctx, selected, max_workers=None, err_file_path=ERROR_LOG_FILE):
+    """
+    Run the selected tasks as a dependency graph on a thread pool.
+
+    A task starts as soon as all of its selected dependencies have succeeded; if a
+    dependency fails, its dependents are skipped. Returns name -> (status, seconds, error).
+    """
+    deps = {name: [d for d in TASKS[name][0] if d in selected] for name in selected}
+    results = {}
+    running = {}
+    started = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(selected) or 1) as executor:
+        while len(results) < len(selected):
+            for name in selected:
+                if name in results or name in running.values():
+                    continue
+                if any(results.get(d, ("",))[0] in ("failed", "skipped") for d in deps[name]):
+                    results[name] = ("skipped", 0.0, "dependency failed")
+                    print(f"⏭️ Skipping {name}: dependency failed")
+                elif all(results.get(d, ("",))[0] == "ok" for d in deps[name]):
+                    print(f"▶️ Starting {name}")
+                    started[name] = time.perf_counter()
+                    running[executor.submit(TASKS[name][1], ctx)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                seconds = time.perf_counter() - started[name]
+                try:
+                    future.result()
+                    results[name] = ("ok", seconds, None)
+                    print(f"✅ Finished {name} in {seconds:.1f}s")
+                except Exception as e:
+                    results[name] = ("failed", seconds, str(e))
+                    error_message = f"Task {name} failed: {e}\n{traceback.format_exc()}"
+                    if err_file_path:
+                        log_error(err_file_path, error_message)
+                    print(error_message)
+
+    return results
+
+
+def print_report(results, total_seconds):
+    """Print per-task status and timing."""
+    print(f"\n{'task':<16} {'status':<8} {'seconds':>9}")
+    for name, (status, seconds, error) in results.items():
+        line = f"{name:<16} {status:<8} {seconds:>9.1f}"
+        print(f"{line}  {error}" if error else line)
+    print(f"{'total':<16} {'':<8} {total_seconds:>9.1f}")
+
+
+def main(is_test, only=None, skip=None, max_workers=None, interval=1.0, schedule=True, max_symbols=None):
+    selected = select_tasks(only, skip)
+    client = get_gcs_client()
+    scheduler = PriorityScheduler.load(client) if schedule else None
+    ctx = CrawlContext(is_test, client=client, rate_limiter=RateLimiter(interval=interval),
+                       scheduler=scheduler, max_symbols=max_symbols)
+
+    start = time.perf_counter()
+    results = run_dag(ctx, selected, max_workers=max_workers)
+    if scheduler is not None:
+        scheduler.save(client)
+    print_report(results, time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crawl services as one dependency graph.")
+    parser.add_argument("--only", nargs="+", choices=list(TASKS), help="Run only these tasks.")
+    parser.add_argument("--skip", nargs="+", choices=list(TASKS), help="Skip these tasks.")
+    parser.add_argument("--workers", type=int, default=None, help="Maximum number of tasks running at once.")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Minimum seconds between API requests, shared by all tasks (default: 1.0).")
+    parser.add_argument("--schedule", action=argparse.BooleanOptionalAction, default=True,
+                        help="Only crawl symbols that are due, most liquid first (default: on).")
+    parser.add_argument("--max-symbols", type=int, default=None,
+                        help="Crawl at most this many due symbols per dataset.")
+    parser.add_argument("--test", action=argparse.BooleanOptionalAction, default=IS_TEST,
+                        help="Run in test mode (default: IS_TEST).")
+    args = parser.parse_args()
+    stop_on_sigterm()
+    results = main(args.test, only=args.only, skip=args.skip, max_workers=args.workers, interval=args.interval,
+                   schedule=args.schedule, max_symbols=args.max_symbols)
+    if any(status == "failed" for status, _, _ in results.values()):
+        raise SystemExit(1)
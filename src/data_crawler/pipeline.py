@@ -0,0 +1,240 @@
+import queue
+import threading
+import time
+import traceback
+from retry_policy import CircuitOpenError, MAX_DEFER_SECONDS, MIN_DEFER_SECONDS
+
+# Default sizes: fetching is rate limited, so a couple of fetchers keep the limiter
+# busy; uploads are latency bound and cheap, so they get the most threads.
+FETCH_WORKERS = 2
+ENCODE_WORKERS = 2
+UPLOAD_WORKERS = 4
+
+# Results waiting between two stages. A full queue blocks the stage before it,
+# which bounds memory to roughly this many fetched frames plus encoded buffers.
+MAX_PENDING = 8
+
+_DONE = object()
+
+
+class StageStats:
+    """
+    Counters for one stage: `busy` is time spent working, `blocked` time spent waiting
+    on a full output queue and `peak_queue` the deepest that output queue got.
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.peak_queue = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, blocked=0.0, items=0, errors=0, queue_size=0):
+        with self._lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.items += items
+            self.errors += errors
+            self.peak_queue = max(self.peak_queue, queue_size)
+
+    def utilisation(self, wall_seconds):
+        return self.busy / (self.workers * wall_seconds) if wall_seconds else 0.0
+
+
+def run_pipeline(items, fetch, encode, upload, fetch_workers=FETCH_WORKERS, encode_workers=ENCODE_WORKERS,
+                 upload_workers=UPLOAD_WORKERS, max_pending=MAX_PENDING, label="pipeline", err_file_path=None,
+                 log_error=None):
+    """
+    Run fetch -> encode -> upload as three overlapping thread pools joined by bounded queues.
+
+    Parameters:
+        items (iterable): Work items, usually symbols.
+        fetch (callable): fetch(item) -> data, or None to skip the item.
+        encode (callable): encode(item, data) -> list of (blob path, BytesIO) pairs.
+        upload (callable): upload(blob path, buffer).
+        max_pending (int): Capacity of each queue between stages.
+
+    A failure is logged and only drops that item. An item whose endpoint circuit is
+    open (CircuitOpenError) is put back on the fetch queue once the circuit's
+    `retry_in` has passed, for up to MAX_DEFER_SECONDS.
+
+    Returns ({stage name: StageStats}, completed items) and prints per-stage
+    utilisation, so the bottleneck stage is visible. An item is completed when its
+    fetch returned (with or without data) and every file encoded from it was uploaded.
+    """
+    items = list(items)
+    stats = {
+        "fetch": StageStats("fetch", fetch_workers),
+        "encode": StageStats("encode", encode_workers),
+        "upload": StageStats("upload", upload_workers),
+    }
+    item_queue = queue.Queue()
+    encode_queue = queue.Queue(maxsize=max_pending)
+    upload_queue = queue.Queue(maxsize=max_pending)
+
+    # Items not yet settled by the fetch stage; deferred items stay counted until they are
+    remaining = [len(items)]
+    first_deferred = {}
+    settled = threading.Condition()
+
+    # Uploads still outstanding per item; an item leaves `uploading` when its last one lands
+    completed = []
+    uploading = {}
+    failed = set()
+    progress = threading.Lock()
+
+    def complete(item):
+        with progress:
+            completed.append(item)
+
+    def item_failed(item):
+        with progress:
+            failed.add(item)
+            uploading.pop(item, None)
+
+    def uploaded(item):
+        with progress:
+            if item in failed:
+                return
+            uploading[item] -= 1
+            if uploading[item] == 0:
+                del uploading[item]
+                completed.append(item)
+
+    def settle():
+        with settled:
+            remaining[0] -= 1
+            settled.notify_all()
+
+    def defer(item, e):
+        with settled:
+            now = time.monotonic()
+            if now - first_deferred.setdefault(item, now) > MAX_DEFER_SECONDS:
+                return False
+        delay = max(e.retry_in, MIN_DEFER_SECONDS)
+        print(f"⏸️ Deferring {item} for {delay:.0f}s: {e}")
+        timer = threading.Timer(delay, item_queue.put, (item,))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def report_error(stage, key, e):
+        error_message = f"Error in {label} {stage} stage for {key}: {e}\n{traceback.format_exc()}"
+        if log_error and err_file_path:
+            log_error(err_file_path, error_message)
+        print(error_message)
+        stats[stage].add(errors=1)
+
+    def put(stage, out_queue, value):
+        start = time.perf_counter()
+        out_queue.put(value)
+        stats[stage].add(blocked=time.perf_counter() - start, queue_size=out_queue.qsize())
+
+    def fetch_worker():
+        while True:
+            item = item_queue.get()
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                data = fetch(item)
+            except CircuitOpenError as e:
+                if not defer(item, e):
+                    report_error("fetch", item, e)
+                    settle()
+                continue
+            except Exception as e:
+                report_error("fetch", item, e)
+                settle()
+                continue
+            finally:
+                stats["fetch"].add(busy=time.perf_counter() - start)
+            if data is not None:
+                stats["fetch"].add(items=1)
+                put("fetch", encode_queue, (item, data))
+            else:
+                complete(item)
+            settle()
+
+    def encode_worker():
+        while True:
+            entry = encode_queue.get()
+            if entry is _DONE:
+                return
+            item, data = entry
+            start = time.perf_counter()
+            try:
+                outputs = encode(item, data)
+            except Exception as e:
+                report_error("encode", item, e)
+                continue
+            finally:
+                stats["encode"].add(busy=time.perf_counter() - start)
+            del data
+            stats["encode"].add(items=1)
+            if not outputs:
+                complete(item)
+                continue
+            with progress:
+                uploading[item] = len(outputs)
+            for path, buffer in outputs:
+                put("encode", upload_queue, (item, path, buffer))
+
+    def upload_worker():
+        while True:
+            entry = upload_queue.get()
+            if entry is _DONE:
+                return
+            item, path, buffer = entry
+            start = time.perf_counter()
+            try:
+                upload(path, buffer)
+                stats["upload"].add(items=1)
+                uploaded(item)
+            except Exception as e:
+                item_failed(item)
+                report_error("upload", path, e)
+            finally:
+                stats["upload"].add(busy=time.perf_counter() - start)
+
+    def start(target, count):
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    wall_start = time.perf_counter()
+    for item in items:
+        item_queue.put(item)
+    stages = [
+        (item_queue, start(fetch_worker, fetch_workers)),
+        (encode_queue, start(encode_worker, encode_workers)),
+        (upload_queue, start(upload_worker, upload_workers)),
+    ]
+    # Deferred items come back on the fetch queue, so wait for every item to settle first
+    with settled:
+        settled.wait_for(lambda: remaining[0] == 0)
+    # Shut the stages down in order so every item drains through the later ones
+    for in_queue, threads in stages:
+        for _ in threads:
+            in_queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    print_stats(label, stats, time.perf_counter() - wall_start)
+    return stats, completed
+
+
+def print_stats(label, stats, wall_seconds):
+    print(f"\n📊 {label}: finished in {wall_seconds:.1f}s")
+    print(f"{'stage':<8}{'workers':>8}{'items':>8}{'errors':>8}{'busy %':>9}{'blocked %':>11}{'peak queue':>12}")
+    for stage in stats.values():
+        blocked = stage.blocked / (stage.workers * wall_seconds) if wall_seconds else 0.0
+        print(f"{stage.name:<8}{stage.workers:>8}{stage.items:>8}{stage.errors:>8}"
+              f"{stage.utilisation(wall_seconds) * 100:>9.1f}{blocked * 100:>11.1f}{stage.peak_queue:>12}")
+    bottleneck = max(stats.values(), key=lambda stage: stage.utilisation(wall_seconds))
+    print(f"Bottleneck: {bottleneck.name}")
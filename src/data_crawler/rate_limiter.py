@@ -0,0 +1,26 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces request starts at least `interval` seconds apart.
+
+    One instance can be shared by several crawl jobs running in parallel so that
+    together they stay under the API's request rate.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the caller may send its next request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
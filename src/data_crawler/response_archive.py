@@ -0,0 +1,313 @@
+import argparse
+import atexit
+import glob
+import hashlib
+import io
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+# Set ARCHIVE_RESPONSES=false to crawl without archiving
+ARCHIVE_RESPONSES = os.getenv("ARCHIVE_RESPONSES", "True").lower() in ("true", "1", "t")
+
+# Records buffered before a batch file is written, and the longest a record waits for one
+MAX_BATCH_RECORDS = 200
+MAX_BATCH_SECONDS = 60
+# Records per parquet row group: a replay lookup reads the payloads of one row group
+ROW_GROUP_RECORDS = 16
+
+# Dataset -> archived endpoints; the first one lists the symbols a replay covers
+DATASET_ENDPOINTS = {
+    "companies": ["listing.symbols_by_exchange"],
+    "company_info": ["company.overview", "company.profile"],
+    "officers": ["company.officers"],
+    "shareholders": ["company.shareholders"],
+    "dividends": ["company.dividends"],
+    "stock_quote": ["quote.history"],
+    "financial_data": ["finance.income_statement", "finance.balance_sheet", "finance.cash_flow", "finance.ratio"],
+}
+
+RECORD_COLUMNS = ["fetched_at", "endpoint", "symbol", "params", "kind", "columns", "content_hash", "payload"]
+KEY_COLUMNS = ["endpoint", "symbol", "fetched_at", "content_hash"]
+PAYLOAD_COLUMNS = ["kind", "columns", "payload"]
+
+
+def encode_response(response):
+    """
+    Serialize a response to (kind, column labels as JSON, bytes).
+
+    DataFrames are stored as zstd parquet with positional column names and their real
+    labels (tuples for the ratio report's MultiIndex) kept aside, so they round-trip
+    exactly. Object columns parquet cannot hold (mixed types) are stored as strings rather
+    than pickled, as replay loads these files from a shared volume; anything else is JSON.
+    """
+    import pandas as pd
+    if isinstance(response, pd.DataFrame):
+        labels = [list(col) if isinstance(col, tuple) else col for col in response.columns]
+        frame = response.copy()
+        frame.columns = [str(i) for i in range(frame.shape[1])]
+        buffer = io.BytesIO()
+        try:
+            frame.to_parquet(buffer, compression="zstd")
+        except Exception:
+            for col in frame.columns[frame.dtypes == object]:
+                frame[col] = frame[col].where(frame[col].isna(), frame[col].astype(str))
+            buffer = io.BytesIO()
+            frame.to_parquet(buffer, compression="zstd")
+        return "parquet", json.dumps(labels, ensure_ascii=False, default=str), buffer.getvalue()
+    return "json", "null", json.dumps(response, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def decode_response(kind, columns, payload):
+    import pandas as pd
+    if kind == "parquet":
+        frame = pd.read_parquet(io.BytesIO(payload))
+        labels = json.loads(columns)
+        if any(isinstance(label, list) for label in labels):
+            frame.columns = pd.MultiIndex.from_tuples([tuple(label) for label in labels])
+        else:
+            frame.columns = labels
+        return frame
+    if kind == "pickle":
+        raise ValueError("Pickled responses from older archives are not loaded")
+    return json.loads(payload.decode("utf-8"))
+
+
+def read_payload(path, row):
+    """(kind, columns, payload) of one archived record, reading only the row group that holds it."""
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    for group in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(group).num_rows
+        if row < group_rows:
+            record = parquet_file.read_row_group(group, columns=PAYLOAD_COLUMNS).slice(row, 1).to_pylist()[0]
+            return record["kind"], record["columns"], record["payload"]
+        row -= group_rows
+    raise IndexError(f"{path} has no row {row}")
+
+
+class ResponseArchive:
+    """
+    Append-only archive of raw API responses, one directory per crawl date.
+
+    Live mode: `call` runs the fetch and buffers the response under the day it was
+    fetched; batches of records are written as new zstd parquet files named by the hash
+    of their content and never modified. A batch is written at `max_records` records,
+    every `max_seconds` by a background thread, and at exit. A response identical to
+    one already archived that day is skipped.
+    Replay mode: `call` never runs the fetch and returns the latest archived response
+    of (endpoint, symbol) instead, so transformations re-run without API calls. Only
+    the key columns are loaded up front; a payload is read when it is looked up.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, enabled=ARCHIVE_RESPONSES, max_records=MAX_BATCH_RECORDS,
+                 max_seconds=MAX_BATCH_SECONDS):
+        self.root = root
+        self.enabled = enabled
+        self.max_records = max_records
+        self.max_seconds = max_seconds
+        self.replay = False
+        # Crawl date -> buffered records / keys already archived that day
+        self.pending = {}
+        self.seen = {}
+        self.index = {}
+        self._lock = threading.Lock()
+        # Batch files are written outside _lock so fetch threads never wait on the encode
+        # and disk write; writes are serialized so flush() returns once earlier ones are done
+        self._write_lock = threading.Lock()
+        self._flusher = None
+        atexit.register(self.flush)
+
+    def day_dir(self, crawl_date):
+        return os.path.join(self.root, f"crawl_date={crawl_date}")
+
+    def call(self, endpoint, symbol, fetch, **params):
+        """Return the response of `fetch()`, archiving it; in replay mode return the archived one."""
+        if self.replay:
+            return self.lookup(endpoint, symbol)
+        response = fetch()
+        if self.enabled:
+            self.record(endpoint, symbol, params, response)
+        return response
+
+    def record(self, endpoint, symbol, params, response):
+        kind, columns, payload = encode_response(response)
+        content_hash = hashlib.sha256(columns.encode("utf-8") + payload).hexdigest()
+        params = json.dumps(params, sort_keys=True, default=str)
+        fetched_at = datetime.now()
+        crawl_date = fetched_at.strftime("%Y-%m-%d")
+        full = []
+        with self._lock:
+            if crawl_date not in self.seen:
+                # A new day: earlier days only need their pending records written
+                self.seen = {crawl_date: self._load_seen(crawl_date)}
+            key = (endpoint, symbol or "", params, content_hash)
+            if key in self.seen[crawl_date]:
+                return
+            self.seen[crawl_date].add(key)
+            pending = self.pending.setdefault(crawl_date, [])
+            pending.append({
+                "fetched_at": fetched_at, "endpoint": endpoint, "symbol": symbol or "", "params": params,
+                "kind": kind, "columns": columns, "content_hash": content_hash, "payload": payload,
+            })
+            if len(pending) >= self.max_records:
+                full.append((crawl_date, self.pending.pop(crawl_date)))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+        self._write_batches(full)
+
+    def flush(self):
+        """Write every buffered record to the batch directory of the day it was fetched."""
+        with self._lock:
+            batches = [(crawl_date, self.pending.pop(crawl_date)) for crawl_date in list(self.pending)]
+        self._write_batches(batches)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.max_seconds)
+            self.flush()
+
+    def _load_seen(self, crawl_date):
+        """Keys of the records already archived on `crawl_date`, reading only the key columns."""
+        import pandas as pd
+        columns = ["endpoint", "symbol", "params", "content_hash"]
+        files = sorted(glob.glob(os.path.join(self.day_dir(crawl_date), "*.parquet")))
+        if not files:
+            return set()
+        keys = pd.concat([pd.read_parquet(f, columns=columns) for f in files], ignore_index=True)
+        return set(keys.itertuples(index=False, name=None))
+
+    def _write_batches(self, batches):
+        with self._write_lock:
+            for crawl_date, records in batches:
+                self._write_batch(crawl_date, records)
+
+    def _write_batch(self, crawl_date, records):
+        import pandas as pd
+        batch = pd.DataFrame(records, columns=RECORD_COLUMNS)
+        name = hashlib.sha256("".join(batch["content_hash"]).encode()).hexdigest()[:16]
+        day_dir = self.day_dir(crawl_date)
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(day_dir, f"batch-{name}.parquet")
+        # Write then rename so a reader never sees a partial file
+        batch.to_parquet(f"{path}.tmp", index=False, compression="zstd", row_group_size=ROW_GROUP_RECORDS)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, dates=None, endpoints=None):
+        """
+        Index the archived records of the given crawl dates and endpoints (all by default)
+        and switch to replay. Only the key columns are read; the index maps
+        (endpoint, symbol) to the file and row of its latest response.
+        """
+        import pandas as pd
+        pattern = os.path.join(self.root, "crawl_date=*")
+        day_dirs = sorted(glob.glob(pattern)) if not dates else [self.day_dir(d) for d in dates]
+        files = [f for day_dir in day_dirs for f in sorted(glob.glob(os.path.join(day_dir, "*.parquet")))]
+        if not files:
+            raise FileNotFoundError(f"No archived responses under {self.root} for {dates or 'any date'}")
+
+        frames = []
+        for f in files:
+            keys = pd.read_parquet(f, columns=KEY_COLUMNS)
+            keys["file"], keys["row"] = f, range(len(keys))
+            frames.append(keys[keys["endpoint"].isin(endpoints)] if endpoints else keys)
+        records = pd.concat(frames, ignore_index=True)
+        records = records.sort_values("fetched_at").drop_duplicates(subset=["endpoint", "symbol"], keep="last")
+        self.index = {(row.endpoint, row.symbol): (row.file, row.row) for row in records.itertuples(index=False)}
+        self.replay = True
+        print(f"📦 Indexed {len(records)} archived responses from {len(files)} batch files")
+        return records
+
+    def lookup(self, endpoint, symbol):
+        entry = self.index.get((endpoint, symbol or ""))
+        if entry is None:
+            raise KeyError(f"No archived response for {endpoint} {symbol or ''}")
+        return decode_response(*read_payload(*entry))
+
+    def symbols(self, endpoint):
+        return sorted(symbol for archived_endpoint, symbol in self.index if archived_endpoint == endpoint)
+
+
+def stop_on_sigterm():
+    """
+    Handle SIGTERM (docker stop) like Ctrl-C, so long-running services shut down through
+    their KeyboardInterrupt path and the atexit flush of pending records still runs.
+    """
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+
+def replay(datasets, dates=None, root=ARCHIVE_DIR):
+    """
+    Rebuild datasets in the lake from archived responses: the crawl services run their
+    usual transformation and parquet upload, but fetches read the archive and there is
+    no rate limiting.
+    """
+    import importlib
+    import pandas as pd
+    import data_utils
+    from gcs_utils import get_gcs_client
+    from rate_limiter import RateLimiter
+
+    archive = ResponseArchive(root, enabled=False)
+    archive.load(dates, endpoints=[endpoint for dataset in datasets for endpoint in DATASET_ENDPOINTS[dataset]])
+    data_utils.response_archive = archive
+    client = get_gcs_client()
+
+    for dataset in datasets:
+        start = time.perf_counter()
+        module = importlib.import_module(dataset)
+        if dataset == "companies":
+            module.main(client=client)
+        else:
+            symbols = archive.symbols(DATASET_ENDPOINTS[dataset][0])
+            module.main(False, companies_df=pd.DataFrame({"symbol": symbols}), client=client,
+                        rate_limiter=RateLimiter(interval=0))
+        print(f"♻️ Replayed {dataset} in {time.perf_counter() - start:.1f}s")
+
+
+def summary(root=ARCHIVE_DIR):
+    """Records, distinct symbols and compressed payload size per crawl date and endpoint."""
+    import pandas as pd
+    frames = []
+    for day_dir in sorted(glob.glob(os.path.join(root, "crawl_date=*"))):
+        for f in glob.glob(os.path.join(day_dir, "*.parquet")):
+            records = pd.read_parquet(f, columns=["endpoint", "symbol", "payload"])
+            records["crawl_date"] = os.path.basename(day_dir).split("=", 1)[1]
+            records["payload_mb"] = records["payload"].str.len() / 1e6
+            frames.append(records.drop(columns="payload"))
+    if not frames:
+        return pd.DataFrame()
+    return (pd.concat(frames, ignore_index=True)
+            .groupby(["crawl_date", "endpoint"])
+            .agg(records=("symbol", "size"), symbols=("symbol", "nunique"), payload_mb=("payload_mb", "sum"))
+            .round(3).reset_index())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the raw response archive or rebuild datasets from it.")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = subparsers.add_parser("replay", help="Re-run the crawl services from archived responses.")
+    replay_parser.add_argument("datasets", nargs="*", metavar="dataset",
+                               help=f"Datasets to rebuild: {', '.join(DATASET_ENDPOINTS)} (default: all).")
+    replay_parser.add_argument("--date", nargs="+", help="Crawl dates to replay, YYYY-MM-DD (default: all).")
+
+    subparsers.add_parser("summary", help="Show what the archive holds per crawl date.")
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        unknown = set(args.datasets) - set(DATASET_ENDPOINTS)
+        if unknown:
+            parser.error(f"unknown datasets: {', '.join(sorted(unknown))}")
+        replay(args.datasets or list(DATASET_ENDPOINTS), args.date, args.root)
+    else:
+        print(summary(args.root).to_string(index=False))
@@ -0,0 +1,269 @@
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Error classes returned by RetryPolicy.classify
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# VCI answers throttled requests with "... thử lại sau N giây" (retry after N seconds)
+RATE_LIMIT_HINT_PATTERN = re.compile(r"thử lại sau (\d+) giây")
+RATE_LIMIT_PATTERN = re.compile(r"\b429\b|too many requests|rate limit|thử lại sau", re.IGNORECASE)
+HTTP_STATUS_PATTERN = re.compile(r"Failed to fetch data: (\d{3})")
+
+# Parsing errors such as overview.get("exchange")[0] on a delisted symbol never heal by waiting
+PERMANENT_ERRORS = (KeyError, IndexError, TypeError, AttributeError, ValueError, NotImplementedError)
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, OSError)
+
+# Seconds an item may keep being put back because its endpoint's circuit is open before it is given up
+MAX_DEFER_SECONDS = 3600
+# Shortest wait before a deferred item is tried again (a probe may just be in flight)
+MIN_DEFER_SECONDS = 1.0
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit open for {endpoint}, skipping call (retry in {retry_in:.0f}s)")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    After `failure_threshold` consecutive failed calls (a call that used up all of its
+    retries counts once) the circuit opens and every call fails fast for `cooldown`
+    seconds. The first call after the cooldown is let through as a probe: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, endpoint, failure_threshold=5, cooldown=300):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _refuse(self):
+        """Raise CircuitOpenError if a call would be refused now; the caller holds the lock."""
+        now = time.monotonic()
+        if self.opened_until > now:
+            raise CircuitOpenError(self.endpoint, self.opened_until - now)
+        if self.opened_until and self.probing:
+            raise CircuitOpenError(self.endpoint, 0)
+
+    def check(self):
+        """Raise CircuitOpenError if the endpoint would refuse a call, without taking the probe."""
+        with self._lock:
+            self._refuse()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the endpoint should not be called right now."""
+        with self._lock:
+            self._refuse()
+            if self.opened_until:
+                self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self.probing = False
+
+    def record_failure(self, cooldown=None):
+        """Count a failure; open the circuit when the threshold is hit or a cooldown is forced."""
+        with self._lock:
+            self.failures += 1
+            if cooldown is not None or self.probing or self.failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + (cooldown or self.cooldown)
+                self.probing = False
+
+    def release_probe(self):
+        """Let the next call probe again when a probe ended with an error that says nothing about the endpoint."""
+        with self._lock:
+            self.probing = False
+
+
+class RetryPolicy:
+    """
+    Retry policy that classifies errors before deciding how long to wait.
+
+    - rate limit: wait for the server hint ("thử lại sau N giây") plus a buffer.
+      If the hint is longer than `max_delay`, the endpoint's breaker is opened for
+      that long instead and CircuitOpenError is raised, so the caller can defer the
+      item rather than sleep.
+    - transient: exponential backoff with full jitter, capped at `max_delay`.
+    - permanent: raised immediately, and not counted against the endpoint.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=2, max_delay=60, rate_limit_buffer=2,
+                 failure_threshold=5, cooldown=300, sleep=time.sleep, log_error=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_buffer = rate_limit_buffer
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.sleep = sleep
+        self.log_error = log_error
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        """Return the circuit breaker for an endpoint, creating it on first use."""
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.cooldown)
+            return self._breakers[endpoint]
+
+    def check(self, *endpoints):
+        """Raise CircuitOpenError if any of the endpoints would refuse a call right now."""
+        for endpoint in endpoints:
+            self.breaker(endpoint).check()
+
+    def classify(self, error):
+        """Return RATE_LIMIT, TRANSIENT or PERMANENT for an exception."""
+        msg = str(error)
+        if RATE_LIMIT_PATTERN.search(msg):
+            return RATE_LIMIT
+
+        # vnstock wraps non-200 responses as ConnectionError("Failed to fetch data: <status> - <reason>")
+        match = HTTP_STATUS_PATTERN.search(msg)
+        if match:
+            status = int(match.group(1))
+            if status == 429:
+                return RATE_LIMIT
+            if 400 <= status < 500 and status not in (408, 425):
+                return PERMANENT
+            return TRANSIENT
+
+        if isinstance(error, TRANSIENT_ERRORS):
+            return TRANSIENT
+        if isinstance(error, PERMANENT_ERRORS):
+            return PERMANENT
+        # Unknown errors keep the old behaviour of being retried
+        return TRANSIENT
+
+    def rate_limit_delay(self, error):
+        """Seconds the server asked us to wait, plus a buffer, or None if there was no hint."""
+        match = RATE_LIMIT_HINT_PATTERN.search(str(error))
+        if match:
+            return int(match.group(1)) + self.rate_limit_buffer
+
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+        if retry_after and str(retry_after).isdigit():
+            return int(retry_after) + self.rate_limit_buffer
+        return None
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff for the given (0-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, args=(), kwargs=None, endpoint=None, err_file_path=None):
+        """Call func(*args, **kwargs) under this policy, logging retries to err_file_path."""
+        kwargs = kwargs or {}
+        endpoint = endpoint or func.__name__
+        breaker = self.breaker(endpoint)
+
+        # Checked once per call: the retries below belong to a call that was let through
+        breaker.before_call()
+        for attempt in range(self.max_attempts):
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                kind = self.classify(e)
+                if kind == PERMANENT:
+                    breaker.release_probe()
+                    raise
+
+                last_attempt = attempt + 1 >= self.max_attempts
+                if kind == RATE_LIMIT:
+                    wait_time = self.rate_limit_delay(e) or self.backoff_delay(attempt)
+                    if wait_time > self.max_delay:
+                        # Don't hold the worker; park the endpoint until the server is ready again
+                        breaker.record_failure(cooldown=wait_time)
+                        raise CircuitOpenError(endpoint, wait_time) from e
+                else:
+                    wait_time = self.backoff_delay(attempt)
+
+                if last_attempt:
+                    breaker.record_failure()
+                    raise
+
+                error_message = (f"Retry {attempt + 1} for {endpoint} in {wait_time:.1f}s "
+                                 f"({kind}) due to error: {e}")
+                print(error_message)
+                if err_file_path and self.log_error:
+                    self.log_error(err_file_path, error_message)
+                self.sleep(wait_time)
+            else:
+                breaker.record_success()
+                return result
+
+    def __call__(self, func):
+        """Use the policy as a decorator; the error log path is taken from `err_file_path` or the last argument."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            err_file_path = kwargs.get("err_file_path", args[-1] if args else None)
+            return self.call(func, args, kwargs, endpoint=func.__name__, err_file_path=err_file_path)
+        wrapper.policy = self
+        return wrapper
+
+
+class DeferredItems:
+    """
+    Iterate over work items, letting items whose endpoint circuit is open come back later.
+
+    `defer(item, error)` puts an item aside until `error.retry_in` has passed; ready
+    items are yielded first, and the iterator only sleeps when every remaining item
+    is waiting. An item first deferred more than `max_wait` seconds ago is given up
+    and `defer` returns False.
+    """
+
+    def __init__(self, items, max_wait=MAX_DEFER_SECONDS, sleep=time.sleep):
+        self.ready = deque(items)
+        self.waiting = []
+        self.first_deferred = {}
+        self.max_wait = max_wait
+        self.sleep = sleep
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def defer(self, item, error):
+        with self._lock:
+            now = time.monotonic()
+            if now - self.first_deferred.setdefault(item, now) > self.max_wait:
+                return False
+            ready_at = now + max(error.retry_in, MIN_DEFER_SECONDS)
+            heapq.heappush(self.waiting, (ready_at, next(self._seq), item))
+        print(f"⏸️ Deferring {item} for {max(error.retry_in, MIN_DEFER_SECONDS):.0f}s: {error}")
+        return True
+
+    def __iter__(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self.waiting and self.waiting[0][0] <= now:
+                    self.ready.append(heapq.heappop(self.waiting)[2])
+                if self.ready:
+                    item = self.ready.popleft()
+                elif self.waiting:
+                    item, delay = None, self.waiting[0][0] - now
+                else:
+                    return
+            if item is None:
+                self.sleep(delay)
+            else:
+                yield item
@@ -0,0 +1,137 @@
+import io
+import threading
+from datetime import datetime
+import pandas as pd
+from gcs_utils import upload_bytes_to_gcs, load_parquet_from_gcs
+
+STATE_PATH = "raw/_state/symbol_priority.parquet"
+
+# Days between refreshes per tier: liquid or recently traded symbols every run,
+# the rest on a slower cadence so the nightly runtime stays bounded as the universe grows.
+TIER_CADENCE_DAYS = {1: 1, 2: 3, 3: 7}
+
+# Share of the universe, by liquidity rank, in tier 1 and tiers 1 + 2
+TIER_1_SHARE = 0.3
+TIER_2_SHARE = 0.7
+
+# A symbol traded within this many days is kept in tier 2 or better whatever its liquidity
+RECENT_TRADE_DAYS = 5
+
+# Number of most recent bars used to measure liquidity (average traded value)
+LIQUIDITY_WINDOW = 20
+
+STATE_COLUMNS = ["symbol", "liquidity", "last_traded"]
+
+
+class PriorityScheduler:
+    """
+    Order and thin out the symbol universe per dataset.
+
+    Symbols are ranked by liquidity (average close * volume over the last bars) and
+    placed in tiers; each tier has a refresh cadence and a symbol is only due for a
+    dataset once its cadence has elapsed since it was last crawled for that dataset.
+    Symbols never seen before are due and go first. State is one small parquet file
+    in GCS with a `last_crawled_<dataset>` column per dataset.
+    """
+
+    def __init__(self, state_df=None, today=None):
+        self.state = state_df if state_df is not None else pd.DataFrame(columns=STATE_COLUMNS)
+        self.state = self.state.set_index("symbol")
+        self.today = pd.Timestamp(today or datetime.today()).normalize()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, client, today=None):
+        """Load the state from GCS; a missing file means every symbol is due, a bad one raises."""
+        from google.api_core.exceptions import NotFound
+
+        try:
+            state_df = load_parquet_from_gcs(STATE_PATH, client=client)
+        except NotFound:
+            print("⚠️ No scheduler state found, every symbol is due.")
+            return cls(None, today)
+
+        # State saved while the index had no name keeps the symbols in an `index` column
+        if "symbol" not in state_df.columns and "index" in state_df.columns:
+            state_df = state_df.rename(columns={"index": "symbol"})
+        missing = [column for column in STATE_COLUMNS if column not in state_df.columns]
+        if missing:
+            raise ValueError(f"Scheduler state {STATE_PATH} is missing columns {missing}")
+        return cls(state_df, today)
+
+    def save(self, client):
+        with self._lock:
+            buffer = io.BytesIO()
+            self.state.reset_index(names="symbol").to_parquet(buffer, index=False)
+        buffer.seek(0)
+        upload_bytes_to_gcs(buffer, STATE_PATH, client=client)
+
+    def tiers(self, symbols):
+        """Return a Series symbol -> tier (1 = most important)."""
+        with self._lock:
+            state = self.state.reindex(symbols)
+        rank = state["liquidity"].rank(ascending=False, pct=True)
+        tier = pd.Series(3, index=state.index)
+        tier[rank <= TIER_2_SHARE] = 2
+        tier[rank <= TIER_1_SHARE] = 1
+
+        days_since_trade = (self.today - pd.to_datetime(state["last_traded"])).dt.days
+        tier[(days_since_trade <= RECENT_TRADE_DAYS) & (tier > 2)] = 2
+        # Never measured: crawl first so the symbol gets a liquidity figure
+        tier[state["liquidity"].isna()] = 1
+        return tier
+
+    def schedule(self, companies_df, dataset, max_symbols=None):
+        """
+        Return the rows of companies_df that are due for `dataset`, most important first,
+        truncated to `max_symbols`.
+        """
+        symbols = companies_df["symbol"]
+        tier = self.tiers(symbols)
+        column = f"last_crawled_{dataset}"
+        with self._lock:
+            last_crawled = pd.to_datetime(self.state.reindex(symbols).get(column, pd.Series(index=symbols)))
+            liquidity = self.state["liquidity"].reindex(symbols)
+
+        days_since_crawl = (self.today - last_crawled).dt.days
+        cadence = tier.map(TIER_CADENCE_DAYS)
+        due = (days_since_crawl.isna() | (days_since_crawl >= cadence)).to_numpy()
+
+        plan = pd.DataFrame({
+            "tier": tier.to_numpy(),
+            "liquidity": liquidity.fillna(0).to_numpy(),
+            "overdue": (days_since_crawl - cadence).fillna(float("inf")).to_numpy(),
+        }, index=companies_df.index)[due]
+        plan = plan.sort_values(["tier", "overdue", "liquidity"], ascending=[True, False, False])
+        if max_symbols is not None:
+            plan = plan.head(max_symbols)
+
+        print(f"📋 {dataset}: {len(plan)} of {len(companies_df)} symbols due "
+              f"(tiers: {plan['tier'].value_counts().sort_index().to_dict()})")
+        return companies_df.loc[plan.index]
+
+    def mark_crawled(self, dataset, symbols):
+        """Record that `symbols` were crawled for `dataset` today."""
+        column = f"last_crawled_{dataset}"
+        with self._lock:
+            new_symbols = pd.Index(symbols).difference(self.state.index)
+            if len(new_symbols):
+                self.state = pd.concat([self.state, pd.DataFrame(index=new_symbols.rename("symbol"))])
+            if column not in self.state.columns:
+                self.state[column] = pd.NaT
+            self.state.loc[list(symbols), column] = self.today
+
+    def update_from_quotes(self, quotes_df):
+        """Refresh liquidity and last trade date from crawled daily bars (symbol, time, close, volume)."""
+        quotes_df = quotes_df.sort_values(["symbol", "time"])
+        recent = quotes_df.groupby("symbol").tail(LIQUIDITY_WINDOW)
+        liquidity = (recent["close"] * recent["volume"]).groupby(recent["symbol"]).mean()
+        traded = quotes_df[quotes_df["volume"] > 0]
+        last_traded = pd.to_datetime(traded["time"]).groupby(traded["symbol"]).max().dt.normalize()
+
+        with self._lock:
+            new_symbols = liquidity.index.difference(self.state.index)
+            if len(new_symbols):
+                self.state = pd.concat([self.state, pd.DataFrame(index=new_symbols.rename("symbol"))])
+            self.state.loc[liquidity.index, "liquidity"] = liquidity
+            self.state.loc[last_traded.index, "last_traded"] = last_traded
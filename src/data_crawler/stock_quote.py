@@ -1,8 +1,9 @@
 import os
 from datetime import datetime
-from data_utils import get_stock_quote_history
-from companies import get_companies_df
+from data_utils import collect_stock_quote_history, parquet_buffers_by_year, log_error, wait_for_slot
 from gcs_utils import upload_bytes_to_gcs, get_gcs_client
+from pipeline import run_pipeline
+from rate_limiter import RateLimiter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,24 +12,55 @@ load_dotenv()
 ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
 IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
 
-def main(is_test):
+def main(is_test, companies_df=None, client=None, rate_limiter=None):
+    """
+    Crawl daily bars. Returns the symbols that were crawled and uploaded, and their
+    last LIQUIDITY_WINDOW (symbol, time, close, volume) rows for the scheduler.
+    """
+    import pandas as pd
+    from scheduler import LIQUIDITY_WINDOW
+
     # Get the companies DataFrame
-    companies_df = get_companies_df()
-    
+    if companies_df is None:
+        from companies import get_companies_df
+        companies_df = get_companies_df()
+    if is_test:
+        companies_df = companies_df.head(10)
+    rate_limiter = rate_limiter or RateLimiter(interval=5)
+    client = client or get_gcs_client()
+
     # Define the date range
     end_date = datetime.today().strftime("%Y-%m-%d")
-    
-    # Fetch stock quote history grouped by symbol and year
-    buffers = get_stock_quote_history(companies_df, ERROR_LOG_FILE, start_date="2020-01-01", end_date=end_date, is_test=is_test)
-
-    if buffers:
-        client = get_gcs_client()
-        for (symbol, year), buffer in buffers.items():
-            file_path = f"raw/stock_quote/{symbol}/stock_quote_{year}.parquet"
-            upload_bytes_to_gcs(buffer, file_path, client=client)
+    crawled = []
+
+    # Fetch, encode per (symbol, year) and upload as overlapping stages
+    def fetch(symbol):
+        wait_for_slot(rate_limiter, "fetch_stock_quote_history")
+        quotes_df = collect_stock_quote_history(symbol, "2020-01-01", end_date, ERROR_LOG_FILE)
+        if quotes_df is not None:
+            # The scheduler only needs the recent bars, not the whole history
+            recent = quotes_df.sort_values("time").tail(LIQUIDITY_WINDOW)
+            crawled.append(recent[["symbol", "time", "close", "volume"]])
+        return quotes_df
+
+    def encode(symbol, quotes_df):
+        return [(f"raw/stock_quote/{symbol}/stock_quote_{year}.parquet", buffer)
+                for (_, year), buffer in parquet_buffers_by_year(quotes_df).items()]
+
+    def upload(file_path, buffer):
+        upload_bytes_to_gcs(buffer, file_path, client=client)
+
+    stats, symbols = run_pipeline(companies_df['symbol'], fetch, encode, upload, label="stock_quote",
+                         err_file_path=ERROR_LOG_FILE, log_error=log_error)
+
+    if stats["upload"].items:
         print("Uploaded in-memory Parquet files to GCS successfully.")
     else:
         print("Failed to fetch any stock quote history data.")
+    quotes_df = pd.concat(crawled, ignore_index=True) if crawled else None
+    if quotes_df is not None:
+        quotes_df = quotes_df[quotes_df["symbol"].isin(symbols)]
+    return symbols, quotes_df
 
 if __name__ == "__main__":
     # parser = argparse.ArgumentParser(description="Run the Stock Quote Service pipeline.")
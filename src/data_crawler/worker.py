@@ -0,0 +1,164 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from dotenv import load_dotenv
+from data_utils import log_error, response_archive
+from job_queue import JobQueue, QUEUE_DB
+from orchestrator import CrawlContext, SERVICES, SINGLE_FILE_DATASETS, merge_single_file, run_companies
+from rate_limiter import RateLimiter
+from response_archive import stop_on_sigterm
+
+load_dotenv()
+
+# Environment variables
+ERROR_LOG_FILE = os.getenv("ERROR_LOG_FILE")
+IS_TEST = os.getenv("IS_TEST", "True").lower() in ("true", "1", "t")
+
+CLEANER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_cleaner")
+# data_cleaner modules whose flat import names are also crawler modules (or may become one)
+CLEANER_MODULES = ("gcs_utils", "spark_session", "officers", "shareholders")
+
+
+def symbols_df(ctx, symbols):
+    """Companies rows for the requested symbols, or the whole universe if none were given."""
+    companies_df = ctx.universe()
+    if not symbols:
+        return companies_df
+    subset = companies_df[companies_df["symbol"].isin(symbols)]
+    missing = [s for s in symbols if s not in set(subset["symbol"])]
+    if missing:
+        subset = pd.concat([subset, pd.DataFrame({"symbol": missing})], ignore_index=True)
+    return subset
+
+
+def refresh_single_file(ctx, dataset, symbols):
+    """Re-crawl some symbols of a single-file dataset and merge them into the existing file."""
+    if not merge_single_file(ctx, dataset, symbols_df(ctx, symbols)):
+        raise RuntimeError(f"No {dataset} data collected for {symbols}")
+
+
+def load_cleaners(*names):
+    """
+    Import data_cleaner modules under their own namespace; returns {name: module}.
+
+    The cleaners import their siblings by flat names (gcs_utils, spark_session, ...)
+    that clash with crawler modules. While they load, those names are taken out of
+    sys.modules and resolved from CLEANER_DIR; afterwards the crawler's modules are put
+    back, and the cleaners keep references to the data_cleaner ones.
+    """
+    saved = {name: sys.modules.pop(name) for name in CLEANER_MODULES + names if name in sys.modules}
+    sys.path.insert(0, CLEANER_DIR)
+    try:
+        return {name: importlib.import_module(name) for name in names}
+    finally:
+        sys.path.remove(CLEANER_DIR)
+        for name in CLEANER_MODULES + names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+
+class Worker:
+    """
+    Long-running worker that keeps vnstock, the GCS client and optionally a Spark
+    session warm, and runs queued jobs with bounded concurrency.
+
+    Job kinds:
+        crawl: re-crawl `dataset` for `symbols` (all symbols if empty).
+        clean: run the Spark cleaner for `dataset` (needs --spark).
+    """
+
+    def __init__(self, queue, concurrency=2, interval=1.0, with_spark=False, is_test=IS_TEST):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.ctx = CrawlContext(is_test=is_test, rate_limiter=RateLimiter(interval=interval))
+        self.spark = None
+        self.cleaners = {}
+        if with_spark:
+            self._start_spark()
+
+    def _start_spark(self):
+        cleaners = load_cleaners("spark_session", "officers", "shareholders")
+        self.spark = cleaners["spark_session"].get_spark("Worker")
+        self.cleaners = {
+            "officers": cleaners["officers"].clean_officers,
+            "shareholders": cleaners["shareholders"].clean_shareholders,
+        }
+
+    def run_job(self, job):
+        kind, dataset, symbols = job["kind"], job["dataset"], job["symbols"]
+        if kind == "clean":
+            if dataset not in self.cleaners:
+                raise ValueError(f"No cleaner for {dataset} (is the worker running with --spark?)")
+            self.cleaners[dataset](self.spark, self.ctx.client)
+        elif kind == "crawl":
+            if dataset == "companies":
+                run_companies(self.ctx)
+            elif symbols and dataset in SINGLE_FILE_DATASETS:
+                refresh_single_file(self.ctx, dataset, symbols)
+            elif dataset in SERVICES:
+                SERVICES[dataset].main(self.ctx.is_test, companies_df=symbols_df(self.ctx, symbols),
+                                       client=self.ctx.client, rate_limiter=self.ctx.rate_limiter)
+            else:
+                raise ValueError(f"Unknown dataset: {dataset}")
+        else:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+    def _execute(self, job):
+        start = time.perf_counter()
+        print(f"▶️ Job {job['id']}: {job['kind']} {job['dataset']} {job['symbols'] or 'all symbols'}")
+        try:
+            self.run_job(job)
+            self.queue.finish(job["id"])
+            print(f"✅ Job {job['id']} done in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            error_message = f"Job {job['id']} failed: {e}\n{traceback.format_exc()}"
+            self.queue.finish(job["id"], error=str(e))
+            if ERROR_LOG_FILE:
+                log_error(ERROR_LOG_FILE, error_message)
+            print(error_message)
+        finally:
+            # Archive the job's responses now rather than whenever the worker exits
+            response_archive.flush()
+
+    def serve(self, poll_interval=1.0):
+        """Claim and run jobs until interrupted."""
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"♻️ Re-queued {requeued} job(s) left running by a previous worker")
+        print(f"👷 Worker ready (concurrency={self.concurrency}, spark={'on' if self.spark else 'off'})")
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                while True:
+                    in_flight = {f for f in in_flight if not f.done()}
+                    job = self.queue.claim() if len(in_flight) < self.concurrency else None
+                    if job is None:
+                        time.sleep(poll_interval)
+                        continue
+                    in_flight.add(executor.submit(self._execute, job))
+            except KeyboardInterrupt:
+                print("🛑 Stopping worker, waiting for running jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm worker daemon that runs jobs from the local queue.")
+    parser.add_argument("--queue", default=QUEUE_DB, help="Path to the sqlite queue file.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs running at once (default: 2).")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Minimum seconds between API requests (default: 1.0).")
+    parser.add_argument("--spark", action="store_true", help="Keep a Spark session warm for clean jobs.")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between queue polls.")
+    parser.add_argument("--test", action=argparse.BooleanOptionalAction, default=IS_TEST,
+                        help="Only crawl the first 10 symbols of a job (default: IS_TEST).")
+    args = parser.parse_args()
+
+    stop_on_sigterm()
+    worker = Worker(JobQueue(args.queue), concurrency=args.concurrency, interval=args.interval, with_spark=args.spark,
+                    is_test=args.test)
+    worker.serve(args.poll)
@@ -0,0 +1,79 @@
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data_crawler"))
+
+import scheduler
+from scheduler import PriorityScheduler, STATE_PATH
+
+
+class FakeBucket:
+    """In-memory stand-in for the GCS helpers the scheduler uses."""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def upload(self, buffer, path, client=None):
+        self.blobs[path] = buffer.getvalue()
+
+    def load(self, path, client=None):
+        from google.api_core.exceptions import NotFound
+
+        if path not in self.blobs:
+            raise NotFound(path)
+        return pd.read_parquet(io.BytesIO(self.blobs[path]))
+
+
+class PrioritySchedulerStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = FakeBucket()
+        patches = [
+            mock.patch.object(scheduler, "upload_bytes_to_gcs", self.bucket.upload),
+            mock.patch.object(scheduler, "load_parquet_from_gcs", self.bucket.load),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_save_load_round_trip(self):
+        first = PriorityScheduler.load(None, today="2024-01-10")
+        first.mark_crawled("officers", ["AAA", "BBB"])
+        first.update_from_quotes(pd.DataFrame({
+            "symbol": ["AAA", "CCC"],
+            "time": pd.to_datetime(["2024-01-09", "2024-01-09"]),
+            "close": [10.0, 20.0],
+            "volume": [100, 0],
+        }))
+        first.save(None)
+
+        saved = pd.read_parquet(io.BytesIO(self.bucket.blobs[STATE_PATH]))
+        self.assertIn("symbol", saved.columns)
+
+        second = PriorityScheduler.load(None, today="2024-01-11")
+        self.assertEqual(sorted(second.state.index), ["AAA", "BBB", "CCC"])
+        self.assertEqual(second.state.loc["AAA", "last_crawled_officers"], pd.Timestamp("2024-01-10"))
+        self.assertEqual(second.state.loc["AAA", "liquidity"], 1000.0)
+
+        # AAA was crawled yesterday and is in tier 2; BBB has no liquidity yet and DDD is new
+        companies_df = pd.DataFrame({"symbol": ["AAA", "BBB", "CCC", "DDD"]})
+        due = set(second.schedule(companies_df, "officers")["symbol"])
+        self.assertEqual(due, {"BBB", "CCC", "DDD"})
+
+    def test_load_reads_state_saved_without_index_name(self):
+        legacy = pd.DataFrame({"index": ["AAA"], "liquidity": [1.0], "last_traded": [pd.NaT]})
+        self.bucket.upload(io.BytesIO(legacy.to_parquet(index=False)), STATE_PATH)
+        self.assertEqual(list(PriorityScheduler.load(None).state.index), ["AAA"])
+
+    def test_load_rejects_bad_schema(self):
+        self.bucket.upload(io.BytesIO(pd.DataFrame({"name": ["AAA"]}).to_parquet(index=False)), STATE_PATH)
+        with self.assertRaises(ValueError):
+            PriorityScheduler.load(None)
+
+
+if __name__ == "__main__":
+    unittest.main()